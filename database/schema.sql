@@ -94,10 +94,19 @@ CREATE TABLE IF NOT EXISTS metadata (
     FOREIGN KEY (story_id) REFERENCES stories(id) ON DELETE CASCADE
 );
 
+-- Migrations applied by init_db
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_stories_user_id ON stories(user_id);
-CREATE INDEX IF NOT EXISTS idx_scenes_story_id ON scenes(story_id);
+-- (user_id, created_at) serves the per-user history listing without a sort
+CREATE INDEX IF NOT EXISTS idx_stories_user_created ON stories(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_scenes_story_scene ON scenes(story_id, scene_number);
+CREATE INDEX IF NOT EXISTS idx_metadata_story_key ON metadata(story_id, key);
+CREATE INDEX IF NOT EXISTS idx_reports_story_id ON reports(story_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_story_id ON conversations(story_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
 CREATE INDEX IF NOT EXISTS idx_agent_decisions_story_id ON agent_decisions(story_id);
-CREATE INDEX IF NOT EXISTS idx_user_queries_user_id ON user_queries(user_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_user_queries_user_id ON user_queries(user_id);
@@ -3,14 +3,170 @@ Web-based SQLite Database Viewer
 Similar to phpMyAdmin but for SQLite
 Run this and open http://localhost:5001 in your browser
 """
-from flask import Flask, render_template_string, jsonify, request
+from flask import Flask, Response, render_template_string, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from waitress import serve
 import sqlite3
 import json
+import orjson
+import atexit
+import hashlib
+import queue
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Encode jsonify() responses with orjson instead of the stdlib json module"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 DB_PATH = 'database/story_scenes.db'
 
+# Connection pool - 1 writer + N readers, opened once and reused across requests
+# One reader per server thread so a request never waits for a connection
+SERVER_THREADS = 16
+READ_POOL_SIZE = SERVER_THREADS
+# journal_mode is persisted in the database file, so only the writer sets it
+WRITER_PRAGMAS = "PRAGMA journal_mode=WAL;"
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA cache_size=-1000000;"
+    "PRAGMA mmap_size=268435456;"
+    "PRAGMA busy_timeout=30000;"
+)
+# Prepared statements cached per pooled connection, keyed by SQL text
+STATEMENT_CACHE_SIZE = 256
+
+_read_pool = queue.Queue(maxsize=READ_POOL_SIZE)
+_write_conn = None
+_write_lock = threading.Lock()
+_pool_lock = threading.Lock()
+_pool_ready = False
+
+# /api/stats is polled by the UI - serve counts from memory for a few seconds
+STATS_TTL_SECONDS = 5
+STATS_SQL = (
+    "SELECT (SELECT COUNT(*) FROM users),"
+    " (SELECT COUNT(*) FROM stories),"
+    " (SELECT COUNT(*) FROM scenes)"
+)
+_stats_cache = {'expires': 0.0, 'version': None, 'value': None}
+_stats_lock = threading.Lock()
+
+# ETags: data_version changes whenever another connection commits, so it is
+# probed on the writer connection (which the viewer never writes through).
+# The epoch keeps tags from colliding across restarts.
+DATA_VERSION_SQL = "PRAGMA data_version"
+ETAG_EPOCH = format(time.time_ns(), 'x')
+
+# Planner statistics live in sqlite_stat1 once ANALYZE has run
+STAT1_EXISTS_SQL = "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+
+# Tables the viewer may read - names are validated against this before building SQL
+VALID_TABLES = frozenset({
+    'users', 'stories', 'scenes', 'metadata', 'conversations', 'agent_decisions', 'user_queries', 'reports'
+})
+SELECT_PAGE_SQL = {
+    table: f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?"
+    for table in VALID_TABLES
+}
+# LIKE search statement per table over all its columns, built from the schema on first use
+_like_search = {}
+
+# Keyset pagination for /api/table
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 100
+# Row JSON repeats every key, so pages compress very well
+GZIP_LEVEL = 6
+
+
+def _open_connection(read_only=False):
+    """Open a pooled connection with the performance PRAGMAs applied once
+
+    Readers use mode=ro so SQLite skips write-lock bookkeeping; WAL lets them
+    run alongside the writer.
+    """
+    if read_only:
+        uri = Path(DB_PATH).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False, isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+    else:
+        conn = sqlite3.connect(
+            DB_PATH, check_same_thread=False, isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.executescript(WRITER_PRAGMAS)
+    conn.executescript(CONNECTION_PRAGMAS)
+    return conn
+
+
+def init_pool():
+    """Prefill the reader pool and open the writer connection"""
+    global _write_conn, _pool_ready
+    with _pool_lock:
+        if _pool_ready:
+            return
+        _write_conn = _open_connection()
+        # Refresh planner statistics so COUNT(*) and range scans pick the best index.
+        # Plain optimize only looks at tables this connection has queried, which is
+        # none yet: analyze outright when no stats exist, else check every table.
+        if _write_conn.execute(STAT1_EXISTS_SQL).fetchone() is None:
+            _write_conn.execute("ANALYZE")
+        else:
+            _write_conn.execute("PRAGMA optimize=0x10002")
+        for _ in range(READ_POOL_SIZE):
+            _read_pool.put(_open_connection(read_only=True))
+        _pool_ready = True
+
+
+def close_pool():
+    """Close every pooled connection (registered with atexit)"""
+    global _write_conn, _pool_ready
+    with _pool_lock:
+        while not _read_pool.empty():
+            _read_pool.get_nowait().close()
+        if _write_conn is not None:
+            _write_conn.close()
+            _write_conn = None
+        _pool_ready = False
+
+
+atexit.register(close_pool)
+
+
+@contextmanager
+def _borrow_read_conn():
+    """Check a reader connection out of the pool and return it when done"""
+    init_pool()
+    conn = _read_pool.get()
+    try:
+        yield conn
+    finally:
+        _read_pool.put(conn)
+
+
+@contextmanager
+def _borrow_write_conn():
+    """Use the single writer connection, serialized by a lock"""
+    init_pool()
+    with _write_lock:
+        yield _write_conn
+
 # HTML Template
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -150,6 +306,20 @@ HTML_TEMPLATE = """
             outline: none;
             border-color: #60a5fa;
         }
+        .load-more {
+            display: block;
+            margin: 20px auto 0;
+            padding: 10px 24px;
+            background: #27272a;
+            border: 1px solid #3f3f46;
+            border-radius: 6px;
+            color: #e4e4e7;
+            cursor: pointer;
+            font-size: 14px;
+        }
+        .load-more:hover {
+            background: #3f3f46;
+        }
     </style>
 </head>
 <body>
@@ -179,7 +349,7 @@ HTML_TEMPLATE = """
         </div>
 
         <div class="search-box">
-            <input type="text" id="search" placeholder="Search..." onkeyup="filterTable()">
+            <input type="text" id="search" placeholder="Search..." oninput="filterTable()">
         </div>
 
         <div class="table-container" id="table-container">
@@ -188,11 +358,16 @@ HTML_TEMPLATE = """
                 <tbody id="table-body"></tbody>
             </table>
         </div>
+        <button class="load-more" id="load-more" onclick="loadTable(currentTable, true)" style="display: none;">Load more</button>
     </div>
 
     <script>
+        const PAGE_SIZE = 100;
         let currentTable = 'users';
         let allData = {};
+        let nextCursor = null;
+        let currentQuery = '';
+        let searchTimer = null;
 
         async function loadStats() {
             const res = await fetch('/api/stats');
@@ -202,12 +377,19 @@ HTML_TEMPLATE = """
             document.getElementById('scene-count').textContent = stats.scenes;
         }
 
-        async function loadTable(tableName) {
+        async function loadTable(tableName, append = false) {
             currentTable = tableName;
-            const res = await fetch(`/api/table/${tableName}`);
-            const data = await res.json();
+            let url = currentQuery
+                ? `/api/search/${tableName}?q=${encodeURIComponent(currentQuery)}&limit=${PAGE_SIZE}`
+                : `/api/table/${tableName}?limit=${PAGE_SIZE}`;
+            if (append && nextCursor !== null) url += `&after_id=${nextCursor}`;
+            const res = await fetch(url);
+            const page = await res.json();
+            const data = append ? (allData[tableName] || []).concat(page.rows) : page.rows;
             allData[tableName] = data;
+            nextCursor = page.next_cursor;
             renderTable(data);
+            document.getElementById('load-more').style.display = nextCursor === null ? 'none' : '';
         }
 
         function renderTable(data) {
@@ -249,12 +431,12 @@ HTML_TEMPLATE = """
         }
 
         function filterTable() {
-            const search = document.getElementById('search').value.toLowerCase();
-            const rows = document.querySelectorAll('#table-body tr');
-            rows.forEach(row => {
-                const text = row.textContent.toLowerCase();
-                row.style.display = text.includes(search) ? '' : 'none';
-            });
+            // Debounce keystrokes so the server only searches once typing pauses
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => {
+                currentQuery = document.getElementById('search').value.trim();
+                loadTable(currentTable);
+            }, 200);
         }
 
         // Load on page load
@@ -269,48 +451,177 @@ HTML_TEMPLATE = """
 def index():
     return render_template_string(HTML_TEMPLATE)
 
-@app.route('/api/stats')
-def stats():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM users")
-    users = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM stories")
-    stories = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM scenes")
-    scenes = cursor.fetchone()[0]
-    
-    conn.close()
-    
-    return jsonify({
+def _compute_stats(conn):
+    """Count users, stories and scenes in one statement"""
+    users, stories, scenes = conn.execute(STATS_SQL).fetchone()
+    return {
         'users': users,
         'stories': stories,
         'scenes': scenes
-    })
+    }
+
+def _data_version():
+    with _borrow_write_conn() as conn:
+        return conn.execute(DATA_VERSION_SQL).fetchone()[0]
+
+def _wants_gzip():
+    return 'gzip' in request.accept_encodings
+
+def _conditional(name, build_response):
+    """Answer 304 when the client's ETag still matches the current data version
+
+    The tag covers the query string and the body encoding, so different pages, searches
+    and gzip/identity bodies never share one. build_response gets the data version the
+    tag was built from, so the two can't disagree if a write lands in between.
+    """
+    version = _data_version()
+    args = hashlib.blake2b(request.query_string, digest_size=8).hexdigest()
+    encoding = 'gzip' if _wants_gzip() else 'identity'
+    tag = f"{name}-{ETAG_EPOCH}-{version}-{encoding}-{args}"
+    if request.if_none_match.contains_weak(tag):
+        response = Response(status=304)
+    else:
+        response = build_response(version)
+        if isinstance(response, tuple):
+            # Errors are never cached
+            return response
+    response.set_etag(tag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/api/stats')
+def stats():
+    return _conditional('stats', _stats_response)
+
+def _stats_response(version):
+    # Also recompute when data changed, so a fresh ETag never carries stale counts
+    with _stats_lock:
+        now = time.monotonic()
+        if (_stats_cache['value'] is None or now >= _stats_cache['expires']
+                or _stats_cache['version'] != version):
+            with _borrow_read_conn() as conn:
+                _stats_cache['value'] = _compute_stats(conn)
+            _stats_cache['expires'] = now + STATS_TTL_SECONDS
+            _stats_cache['version'] = version
+        value = _stats_cache['value']
+    
+    return jsonify(value)
 
 @app.route('/api/table/<table_name>')
 def get_table(table_name):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
     # Validate table name to prevent SQL injection
-    valid_tables = ['users', 'stories', 'scenes', 'metadata', 'conversations', 'agent_decisions', 'user_queries', 'reports']
-    if table_name not in valid_tables:
+    if table_name not in VALID_TABLES:
+        return jsonify({'error': 'Invalid table name'}), 400
+    
+    try:
+        limit, after_id = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return _conditional(
+        f"table-{table_name}",
+        lambda version: _table_page_response(SELECT_PAGE_SQL[table_name], (after_id, limit), limit)
+    )
+
+@app.route('/api/search/<table_name>')
+def search_table(table_name):
+    if table_name not in VALID_TABLES:
         return jsonify({'error': 'Invalid table name'}), 400
     
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    try:
+        limit, after_id = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    with _borrow_read_conn() as conn:
+        if table_name not in _like_search:
+            # Every column, like the old client-side filter over the rendered row
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+            where = ' OR '.join(f"CAST({col} AS TEXT) LIKE ? ESCAPE '\\'" for col in columns) or '0'
+            _like_search[table_name] = (
+                f"SELECT * FROM {table_name} WHERE ({where}) AND id > ? ORDER BY id LIMIT ?",
+                len(columns)
+            )
+    
+    sql, column_count = _like_search[table_name]
+    pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return _conditional(
+        f"search-{table_name}",
+        lambda version: _table_page_response(sql, (*[pattern] * column_count, after_id, limit), limit)
+    )
+
+
+def _page_args():
+    """Parse ?limit= and ?after_id= for keyset pagination"""
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        after_id = int(request.args.get('after_id', 0))
+    except ValueError:
+        raise ValueError('limit and after_id must be integers') from None
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return limit, after_id
+
+
+def _table_page_response(sql, params, limit):
+    """Stream one page of rows for a keyset-paginated query"""
+    rows = _stream_table_page(sql, params, limit)
     try:
-        cursor.execute(f"SELECT * FROM {table_name}")
-        rows = cursor.fetchall()
-        data = [dict(row) for row in rows]
-        conn.close()
-        return jsonify(data)
+        # Run the query before the response starts so errors still get a 500
+        next(rows)
     except Exception as e:
-        conn.close()
         return jsonify({'error': str(e)}), 500
+    
+    use_gzip = _wants_gzip()
+    body = _gzip_stream(rows) if use_gzip else rows
+    response = Response(stream_with_context(body), mimetype='application/json')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _gzip_stream(chunks):
+    """Gzip-encode a stream of byte chunks as they are produced"""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _stream_table_page(sql, params, limit):
+    """Yield one page of rows as JSON, fetching rows in small batches
+
+    The first next() only executes the query; the JSON body follows.
+    """
+    with _borrow_read_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        id_index = columns.index('id')
+        yield b''
+        
+        yield b'{"rows":['
+        count = 0
+        last_id = None
+        while True:
+            batch = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not batch:
+                break
+            chunk = b','.join(orjson.dumps(dict(zip(columns, row))) for row in batch)
+            yield chunk if count == 0 else b',' + chunk
+            count += len(batch)
+            last_id = batch[-1][id_index]
+        
+        # A short page means we reached the end of the table
+        next_cursor = last_id if count == limit else None
+        yield b'],"next_cursor":' + orjson.dumps(next_cursor) + b'}'
 
 if __name__ == '__main__':
     print("\n" + "="*60)
@@ -319,5 +630,6 @@ if __name__ == '__main__':
     print(f"📊 Database: {DB_PATH}")
     print(f"🌐 Open in browser: http://localhost:5001")
     print("="*60 + "\n")
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    init_pool()
+    serve(app, host='0.0.0.0', port=5001, threads=SERVER_THREADS)
 
@@ -285,6 +285,11 @@ function makeAPICall(endpoint, options = {}) {
         const hasJsonContent = contentType && contentType.includes('application/json');
 
         if (!response.ok) {
+            // Expired or invalid session token - sign out so the user can log in again
+            if (response.status === 401 && authToken && !options.skipAuth) {
+                logout();
+            }
+
             // Try to parse error message from JSON if available
             if (hasJsonContent) {
                 try {
@@ -3260,9 +3265,9 @@ window.downloadPage = async function (storyId) {
             ? `${API_BASE_URL}/scene_images/${scene.image_path.split(/[/\\]/).pop()}`
             : null;
 
-    // Append timestamp to prevent caching issues
-    if (imageUrl) {
-        imageUrl += `?t=${Date.now()}`;
+    // Versioned URLs (?v=) are already cache-safe; bust the cache only for legacy ones
+    if (imageUrl && !imageUrl.includes('?v=')) {
+        imageUrl += `${imageUrl.includes('?') ? '&' : '?'}t=${Date.now()}`;
     }
 
     // Create canvas with 3:2 aspect ratio (standard book spread)
@@ -3571,9 +3576,9 @@ window.exportBook = async function (storyId) {
                     ? `${API_BASE_URL}/scene_images/${scene.image_path.split(/[/\\]/).pop()}`
                     : null;
 
-            // Append timestamp to prevent caching issues
-            if (imageUrl) {
-                imageUrl += `?t=${Date.now()}-${i}`;
+            // Versioned URLs (?v=) are already cache-safe; bust the cache only for legacy ones
+            if (imageUrl && !imageUrl.includes('?v=')) {
+                imageUrl += `${imageUrl.includes('?') ? '&' : '?'}t=${Date.now()}-${i}`;
             }
 
             const canvas = document.createElement('canvas');
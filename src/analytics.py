@@ -1,156 +1,285 @@
 """
 Analytics Features: Summarization, Classification, Pattern Detection
 """
-import json
-from typing import Dict, List
+import os
+import re
+import asyncio
+import hashlib
+import functools
+from typing import Callable, Dict, List, TypeVar
+import orjson
+from diskcache import Cache
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
 
 load_dotenv()
 
+T = TypeVar("T")
+
+# Responses are cached by prompt hash so re-renders and retries skip the API
+# Anchored to the project (not the working directory) unless configured
+CACHE_DIR = os.getenv("ANALYTICS_CACHE_DIR") or os.path.join(os.path.dirname(__file__), '..', 'cache', 'analytics')
+CACHE_TTL_SECONDS = 86400
+
+
+@functools.lru_cache(maxsize=1)
+def _get_response_cache() -> Cache:
+    """Open the response cache on first use, so importing this module touches no disk"""
+    return Cache(CACHE_DIR)
+
+# Markdown code fences the model sometimes wraps around JSON
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+
+def _strip_fences(response: str) -> str:
+    return _FENCE_RE.sub('', response).strip()
+
+
+@functools.lru_cache(maxsize=8)
+def _get_llm(model_name: str, temperature: float) -> ChatGoogleGenerativeAI:
+    """Build the LLM client once per configuration and share it across engines"""
+    # Configure LLM with no retries on rate limits
+    return ChatGoogleGenerativeAI(
+        model=model_name,
+        max_retries=0,  # Disable automatic retries
+        temperature=temperature
+    )
+
+
 class AnalyticsEngine:
     def __init__(self, model_name: str = "gemini-2.5-flash"):
-        # Configure LLM with no retries on rate limits
-        self.llm = ChatGoogleGenerativeAI(
-            model=model_name,
-            max_retries=0,  # Disable automatic retries
-            temperature=0.7
-        )
+        self.model_name = model_name
+        self.llm = _get_llm(model_name, 0.7)
         
         # Summarization Template
-        self.summarize_template = PromptTemplate(
-            input_variables=["text", "type"],
-            template=(
-                "You are a professional story analyst. "
-                "Create a concise {type} summary of the following text. "
-                "Keep it brief (2-3 sentences for story, 1 sentence for scene).\n\n"
-                "Text:\n\"\"\"\n{text}\n\"\"\"\n\n"
-                "Summary:"
-            )
-        )
+        self._summarize_fmt = (
+            "You are a professional story analyst. "
+            "Create a concise {type} summary of the following text. "
+            "Keep it brief (2-3 sentences for story, 1 sentence for scene).\n\n"
+            "Text:\n\"\"\"\n{text}\n\"\"\"\n\n"
+            "Summary:"
+        ).format
         
-        # Classification Template
-        self.classify_template = PromptTemplate(
-            input_variables=["text"],
-            template=(
-                "You are a story classifier. Analyze the following story and classify it. "
-                "Return ONLY a JSON object with these keys: "
-                "genre (one of: Mystery, Sci-Fi, Fantasy, Romance, Thriller, Horror, Drama, Comedy, Action, Adventure), "
-                "style (one of: Cinematic, Anime, Watercolor, Noir, Cyberpunk, Realistic, Abstract), "
-                "scene_type (one of: Action, Dialogue, Setting, Transition, Climax, Resolution). "
-                "Do not include any explanation or code fences.\n\n"
-                "Story:\n\"\"\"\n{text}\n\"\"\""
-            )
-        )
+        # Story Analysis Template - title, summary and classification in one call
+        self._analyze_fmt = (
+            "You are a professional story analyst. Analyze the following story prompt. "
+            "Return ONLY a JSON object with these keys: "
+            "title (a compelling, concise title of 2-6 words that captures the essence of the story, no quotes), "
+            "summary (a concise story summary of 2-3 sentences), "
+            "genre (one of: Mystery, Sci-Fi, Fantasy, Romance, Thriller, Horror, Drama, Comedy, Action, Adventure), "
+            "style (one of: Cinematic, Anime, Watercolor, Noir, Cyberpunk, Realistic, Abstract), "
+            "scene_type (one of: Action, Dialogue, Setting, Transition, Climax, Resolution). "
+            "Do not include any explanation or code fences.\n\n"
+            "Story:\n\"\"\"\n{text}\n\"\"\""
+        ).format
         
         # Pattern Detection Template
-        self.pattern_template = PromptTemplate(
-            input_variables=["scenes"],
-            template=(
-                "You are a narrative pattern analyst. Analyze the following scenes and detect patterns. "
-                "Return ONLY a JSON object with these keys: "
-                "narrative_structure (one of: Three-Act, Hero's Journey, Linear, Non-Linear, Episodic), "
-                "themes (array of recurring themes), "
-                "character_arcs (array of character development patterns), "
-                "visual_consistency_score (0-1, how consistent the visual style is), "
-                "pacing (one of: Fast, Medium, Slow). "
-                "Do not include any explanation or code fences.\n\n"
-                "Scenes:\n\"\"\"\n{scenes}\n\"\"\""
-            )
-        )
+        self._pattern_fmt = (
+            "You are a narrative pattern analyst. Analyze the following scenes and detect patterns. "
+            "Return ONLY a JSON object with these keys: "
+            "narrative_structure (one of: Three-Act, Hero's Journey, Linear, Non-Linear, Episodic), "
+            "themes (array of recurring themes), "
+            "character_arcs (array of character development patterns), "
+            "visual_consistency_score (0-1, how consistent the visual style is), "
+            "pacing (one of: Fast, Medium, Slow). "
+            "Do not include any explanation or code fences.\n\n"
+            "Scenes:\n\"\"\"\n{scenes}\n\"\"\""
+        ).format
         
-        # Title Generation Template
-        self.title_template = PromptTemplate(
-            input_variables=["prompt"],
-            template=(
-                "You are a creative story title generator. Based on the following story prompt, "
-                "generate a compelling, concise title (2-6 words maximum). "
-                "The title should be engaging and capture the essence of the story. "
-                "Return ONLY the title text, nothing else. No quotes, no explanation, just the title.\n\n"
-                "Story Prompt:\n\"\"\"\n{prompt}\n\"\"\"\n\n"
-                "Title:"
-            )
-        )
+    
+    def _cache_key(self, prompt: str) -> str:
+        return hashlib.blake2b(f"{self.model_name}\0{prompt}".encode(), digest_size=16).hexdigest()
+    
+    def _predict(self, prompt: str, parse: Callable[[str], T]) -> T:
+        """Call the LLM and parse the response, reusing the cached response for an identical prompt.
+
+        Only responses that parse are cached, so one bad reply isn't served for a day.
+        """
+        key = self._cache_key(prompt)
+        cached = _get_response_cache().get(key)
+        if cached is not None:
+            try:
+                return parse(cached)
+            except Exception:
+                # Stored before responses were validated; fetch a fresh one
+                _get_response_cache().delete(key)
+        response = self.llm.invoke(prompt).content
+        result = parse(response)
+        _get_response_cache().set(key, response, expire=CACHE_TTL_SECONDS)
+        return result
+    
+    async def _apredict(self, prompt: str, parse: Callable[[str], T]) -> T:
+        """Async variant of _predict so independent LLM calls can overlap
+
+        The cache is SQLite plus files, so it is read and written off the event loop.
+        """
+        key = self._cache_key(prompt)
+        cache = await asyncio.to_thread(_get_response_cache)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            try:
+                return parse(cached)
+            except Exception:
+                # Stored before responses were validated; fetch a fresh one
+                await asyncio.to_thread(cache.delete, key)
+        response = (await self.llm.ainvoke(prompt)).content
+        result = parse(response)
+        await asyncio.to_thread(cache.set, key, response, expire=CACHE_TTL_SECONDS)
+        return result
+    
+    def analyze_story(self, text: str) -> Dict:
+        """Generate title, summary, genre, style and scene type in a single LLM call"""
+        try:
+            analysis = self._predict(self._analyze_fmt(text=text), self._parse_analysis_json)
+        except Exception as e:
+            print(f"Story analysis error: {e}")
+            analysis = {}
+        return self._complete_analysis(analysis, text)
+    
+    async def aanalyze_story(self, text: str) -> Dict:
+        """Async variant of analyze_story"""
+        try:
+            analysis = await self._apredict(self._analyze_fmt(text=text), self._parse_analysis_json)
+        except Exception as e:
+            print(f"Story analysis error: {e}")
+            analysis = {}
+        return self._complete_analysis(analysis, text)
     
     def summarize(self, text: str, summary_type: str = "story") -> str:
         """Generate a summary of the text"""
+        if summary_type == "story":
+            return self.analyze_story(text)["summary"]
         try:
-            prompt = self.summarize_template.format(text=text, type=summary_type)
-            response = self.llm.predict(prompt)
-            return response.strip()
+            prompt = self._summarize_fmt(text=text, type=summary_type)
+            return self._predict(prompt, self._parse_text)
         except Exception as e:
             print(f"Summarization error: {e}")
-            return f"Summary: {text[:100]}..." if len(text) > 100 else text
+            return self._fallback_summary(text)
     
-    def classify(self, text: str) -> Dict:
-        """Classify story by genre, style, and scene type"""
+    async def asummarize(self, text: str, summary_type: str = "story") -> str:
+        """Async variant of summarize"""
+        if summary_type == "story":
+            return (await self.aanalyze_story(text))["summary"]
         try:
-            prompt = self.classify_template.format(text=text)
-            response = self.llm.predict(prompt)
-            # Clean response (remove markdown code blocks if present)
-            response = response.strip()
-            if response.startswith("```"):
-                response = response.split("```")[1]
-                if response.startswith("json"):
-                    response = response[4:]
-            response = response.strip()
-            classification = json.loads(response)
-            return classification
+            prompt = self._summarize_fmt(text=text, type=summary_type)
+            return await self._apredict(prompt, self._parse_text)
         except Exception as e:
-            print(f"Classification error: {e}")
-            return {
-                "genre": "Drama",
-                "style": "Cinematic",
-                "scene_type": "Setting"
-            }
+            print(f"Summarization error: {e}")
+            return self._fallback_summary(text)
+    
+    def classify(self, text: str) -> Dict:
+        """Classify story by genre, style, and scene type"""
+        return self._pick_classification(self.analyze_story(text))
+    
+    async def aclassify(self, text: str) -> Dict:
+        """Async variant of classify"""
+        return self._pick_classification(await self.aanalyze_story(text))
     
     def detect_patterns(self, scenes: List[Dict]) -> Dict:
         """Detect narrative patterns in scenes"""
         try:
-            scenes_text = "\n".join([
-                f"Scene {s.get('scene_number', i+1)}: {s.get('scene_text', '')}"
-                for i, s in enumerate(scenes)
-            ])
-            prompt = self.pattern_template.format(scenes=scenes_text)
-            response = self.llm.predict(prompt)
-            # Clean response
-            response = response.strip()
-            if response.startswith("```"):
-                response = response.split("```")[1]
-                if response.startswith("json"):
-                    response = response[4:]
-            response = response.strip()
-            patterns = json.loads(response)
-            return patterns
+            return self._predict(self._pattern_prompt(scenes), self._parse_json)
         except Exception as e:
             print(f"Pattern detection error: {e}")
-            return {
-                "narrative_structure": "Linear",
-                "themes": [],
-                "character_arcs": [],
-                "visual_consistency_score": 0.7,
-                "pacing": "Medium"
-            }
+            return self._fallback_patterns()
     
-    def generate_title(self, prompt: str) -> str:
-        """Generate a compelling title from story prompt"""
+    async def adetect_patterns(self, scenes: List[Dict]) -> Dict:
+        """Async variant of detect_patterns"""
         try:
-            prompt_text = self.title_template.format(prompt=prompt)
-            response = self.llm.predict(prompt_text)
-            # Clean response - remove quotes, extra whitespace, etc.
-            title = response.strip()
-            # Remove surrounding quotes if present
-            if title.startswith('"') and title.endswith('"'):
-                title = title[1:-1]
-            elif title.startswith("'") and title.endswith("'"):
-                title = title[1:-1]
-            # Limit to reasonable length (50 chars max)
-            if len(title) > 50:
-                title = title[:47] + "..."
-            return title.strip()
+            return await self._apredict(self._pattern_prompt(scenes), self._parse_json)
         except Exception as e:
-            print(f"Title generation error: {e}")
+            print(f"Pattern detection error: {e}")
+            return self._fallback_patterns()
+    
+    def generate_title(self, prompt: str) -> str:
+        """Generate a compelling title from story prompt"""
+        return self.analyze_story(prompt)["title"]
+    
+    async def agenerate_title(self, prompt: str) -> str:
+        """Async variant of generate_title"""
+        return (await self.aanalyze_story(prompt))["title"]
+    
+    async def analyze(self, story: str, scenes: List[Dict]):
+        """Run story analysis and pattern detection concurrently
+
+        Returns (analysis, patterns); wall time is the slower call, not the sum.
+        """
+        return await asyncio.gather(self.aanalyze_story(story), self.adetect_patterns(scenes))
+    
+    def _pattern_prompt(self, scenes: List[Dict]) -> str:
+        scenes_text = "\n".join([
+            f"Scene {s.get('scene_number', i+1)}: {s.get('scene_text', '')}"
+            for i, s in enumerate(scenes)
+        ])
+        return self._pattern_fmt(scenes=scenes_text)
+    
+    @staticmethod
+    def _parse_json(response: str):
+        """Parse an LLM JSON response, removing markdown code blocks if present"""
+        return orjson.loads(_strip_fences(response))
+    
+    @classmethod
+    def _parse_analysis_json(cls, response: str) -> Dict:
+        analysis = cls._parse_json(response)
+        if not isinstance(analysis, dict):
+            raise ValueError("Expected a JSON object")
+        return analysis
+    
+    @staticmethod
+    def _parse_text(response: str) -> str:
+        text = response.strip()
+        if not text:
+            raise ValueError("Empty response")
+        return text
+    
+    def _complete_analysis(self, analysis: Dict, text: str) -> Dict:
+        """Fill in fallbacks for any fields an analyze_story response is missing"""
+        return {
+            "title": self._clean_title(str(analysis.get("title") or ""), text),
+            "summary": str(analysis.get("summary") or "").strip() or self._fallback_summary(text),
+            "genre": analysis.get("genre") or "Drama",
+            "style": analysis.get("style") or "Cinematic",
+            "scene_type": analysis.get("scene_type") or "Setting"
+        }
+    
+    @staticmethod
+    def _pick_classification(analysis: Dict) -> Dict:
+        return {
+            "genre": analysis["genre"],
+            "style": analysis["style"],
+            "scene_type": analysis["scene_type"]
+        }
+    
+    @staticmethod
+    def _clean_title(title: str, prompt: str) -> str:
+        """Tidy an LLM title, falling back to the first words of the prompt"""
+        # Clean response - remove quotes, extra whitespace, etc.
+        title = title.strip()
+        # Remove surrounding quotes if present
+        if title.startswith('"') and title.endswith('"'):
+            title = title[1:-1]
+        elif title.startswith("'") and title.endswith("'"):
+            title = title[1:-1]
+        title = title.strip()
+        if not title:
             # Fallback: create a title from first few words
             words = prompt.split()[:6]
-            return " ".join(words) + ("..." if len(prompt.split()) > 6 else "")
\ No newline at end of file
+            return " ".join(words) + ("..." if len(prompt.split()) > 6 else "")
+        # Limit to reasonable length (50 chars max)
+        if len(title) > 50:
+            title = title[:47] + "..."
+        return title
+    
+    @staticmethod
+    def _fallback_summary(text: str) -> str:
+        return f"Summary: {text[:100]}..." if len(text) > 100 else text
+    
+    @staticmethod
+    def _fallback_patterns() -> Dict:
+        return {
+            "narrative_structure": "Linear",
+            "themes": [],
+            "character_arcs": [],
+            "visual_consistency_score": 0.7,
+            "pacing": "Medium"
+        }
@@ -4,11 +4,22 @@ FastAPI Backend Server
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.datastructures import QueryParams
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
+from pathlib import Path
 import os
 import json
-from datetime import datetime
+import codecs
+import hashlib
+import asyncio
+import secrets
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from datetime import datetime, timedelta, timezone
+import jwt
 
 from src.models import (
     UserRegister, UserLogin, UserResponse, StoryInput, StoryResponse, SceneOutput,
@@ -16,30 +27,36 @@ from src.models import (
 )
 from pydantic import BaseModel as PydanticBaseModel, Field
 from src.database import (
-    init_db, create_user, get_user_by_email, get_user_by_id, verify_password,
-    create_story, get_story, get_user_stories, create_scene, get_story_scenes,
+    init_db, create_user, get_user_by_email, get_user_by_id, verify_password, password_needs_rehash,
+    create_story, get_story, get_user_stories, search_user_stories, filter_user_stories, create_scenes_bulk, get_story_scenes,
     log_agent_decision, log_user_query, create_report, set_metadata,
-    update_story, delete_story, archive_story, update_user_username, update_user_password
+    update_story, delete_story, archive_story, update_user_username, update_user_password,
+    update_story_status, update_scene_image, fetch_story_bundle, get_archived_stories
 )
-from src.scene_generator import SceneGenerator
+from src.scene_generator import SceneGenerator, is_rate_limit_error
 from src.image_generator import ImageGenerator
 from src.analytics import AnalyticsEngine
 from src.memory import AgentMemory
+from src.document_parser import extract_pdf_text, extract_docx_text, shutdown_pdf_pool
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Story-to-Scene Generator API")
-
-# Force CORS headers on all responses (including StaticFiles)
-@app.middleware("http")
-async def add_cors_headers(request, call_next):
-    response = await call_next(request)
-    response.headers["Access-Control-Allow-Origin"] = "*"
-    return response
-
-
-# CORS Configuration - Explicitly allow all methods including DELETE and PUT
+# Handlers only enqueue records; a background thread does the actual (blocking) stream writes
+logger = logging.getLogger("api")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = SimpleQueue()
+logger.addHandler(QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+
+app = FastAPI(title="Story-to-Scene Generator API", default_response_class=ORJSONResponse)
+
+# CORS Configuration - Explicitly allow all methods including DELETE and PUT.
+# Middleware wraps the whole app, so mounted StaticFiles get the headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -52,41 +69,66 @@ app.add_middleware(
 # Security
 security = HTTPBearer(auto_error=False)
 
+ALLOWED_UPLOAD_EXTENSIONS = frozenset({'.pdf', '.docx', '.txt', '.jpg', '.jpeg', '.png'})
+
+# Signed session tokens are verified locally, so authentication needs no database lookup.
+# Every worker must share JWT_SECRET_KEY; a per-process random key is only allowed for
+# local development (ALLOW_EPHEMERAL_JWT_KEY=1), where a restart logs everyone out.
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+if not JWT_SECRET_KEY:
+    if os.getenv("ALLOW_EPHEMERAL_JWT_KEY", "").lower() not in ("1", "true", "yes"):
+        raise RuntimeError(
+            "JWT_SECRET_KEY is not set. Set it in .env (or ALLOW_EPHEMERAL_JWT_KEY=1 for local development)."
+        )
+    JWT_SECRET_KEY = secrets.token_urlsafe(32)
+    logger.warning(
+        "JWT_SECRET_KEY is not set - signing tokens with a random per-process key. "
+        "Tokens will not survive a restart or work across multiple workers."
+    )
+JWT_ALGORITHM = "HS256"
+JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "15"))
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     init_db()
 
-# Dependency to get current user (simplified - in production use JWT)
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_pdf_pool()
+    _log_listener.stop()
+
+def create_access_token(user_id: int) -> str:
+    """Issue a short-lived signed token for a user"""
+    now = datetime.now(timezone.utc)
+    payload = {
+        "sub": str(user_id),
+        "iat": now,
+        "exp": now + timedelta(minutes=JWT_EXPIRE_MINUTES)
+    }
+    return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+# Dependency to get current user
 def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> int:
-    """Get current user ID from token (simplified for now)"""
-    # In production, decode JWT token here
-    # For now, we'll use a simple user_id in the token
+    """Get current user ID from a signed token"""
     if not credentials:
         raise HTTPException(status_code=401, detail="Authentication required")
     try:
-        user_id = int(credentials.credentials)
-        # Verify user exists by checking database
-        from src.database import get_db_connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE id = ?", (user_id,))
-        if not cursor.fetchone():
-            conn.close()
-            raise HTTPException(status_code=401, detail="User not found")
-        conn.close()
-        return user_id
-    except ValueError:
-        raise HTTPException(status_code=401, detail="Invalid token format")
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
+        payload = jwt.decode(credentials.credentials, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        return int(payload["sub"])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Session expired, please log in again")
+    except (jwt.InvalidTokenError, KeyError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid token")
 
 
 # Authentication Endpoints
 @app.post("/api/auth/register", response_model=UserResponse)
 async def register(user_data: UserRegister):
     """Register a new user"""
-    user_id = create_user(user_data.username, user_data.email, user_data.password)
+    # Argon2 hashing is deliberately slow - keep it off the event loop
+    user_id = await asyncio.to_thread(create_user, user_data.username, user_data.email, user_data.password)
     if not user_id:
         raise HTTPException(status_code=400, detail="Email or username already exists")
     
@@ -107,12 +149,15 @@ async def login(credentials: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(credentials.password, user["password_hash"]):
+    if not await asyncio.to_thread(verify_password, credentials.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # In production, return JWT token
+    # Upgrade legacy SHA-256 hashes (and outdated Argon2 parameters) now that we know the password
+    if password_needs_rehash(user["password_hash"]):
+        await asyncio.to_thread(update_user_password, user["id"], credentials.password)
+    
     return {
-        "access_token": str(user["id"]),
+        "access_token": create_access_token(user["id"]),
         "token_type": "bearer",
         "user": UserResponse(
             id=user["id"],
@@ -129,59 +174,66 @@ async def login(credentials: UserLogin):
 async def generate_scenes(story_input: StoryInput, user_id: int = Depends(get_current_user)):
     """Generate scenes from story prompt"""
     story_id = None
+    scenes_task = None
+    patterns_task = None
     try:
         # Limit max_scenes to 8
         max_scenes = min(story_input.max_scenes, 8)
         # Initialize generators
         analytics = AnalyticsEngine()
         memory = AgentMemory(user_id)
+        # Initialize scene generator (style is not used in scene generation, only in image generation)
+        scene_gen = SceneGenerator(max_scenes=max_scenes)
+        
+        # Scene generation doesn't depend on the story analysis, so start it right away
+        scenes_task = asyncio.create_task(scene_gen.agenerate_scenes(story_input.prompt))
         
         # Get user preferences from memory
-        preferences = memory.get_user_preferences()
+        preferences = await asyncio.to_thread(memory.get_user_preferences)
         if preferences.get("preferred_style") and not story_input.style:
             story_input.style = preferences.get("preferred_style")
         
-        # Classify the story
-        classification = analytics.classify(story_input.prompt)
+        # Title, summary and classification come back from a single LLM call
+        analysis = await analytics.aanalyze_story(story_input.prompt)
+        classification = {
+            "genre": analysis["genre"],
+            "style": analysis["style"],
+            "scene_type": analysis["scene_type"]
+        }
         genre = classification.get("genre", "Drama")
         # Determine style (from input, preferences, or classification)
         style = story_input.style or preferences.get("preferred_style") or classification.get("style", "Cinematic")
         
-        # Initialize scene generator (style is not used in scene generation, only in image generation)
-        scene_gen = SceneGenerator(max_scenes=max_scenes)
-        
-        # Generate title from prompt using LLM 
-        try:
-            title = analytics.generate_title(story_input.prompt)
-        except Exception as title_error:
-            print(f"Title generation failed: {title_error}")
-            # Fallback to a better default title
-            words = story_input.prompt.split()[:6]
-            title = " ".join(words) + ("..." if len(story_input.prompt.split()) > 6 else "")
-            if len(title) > 50:
-                title = title[:47] + "..."
+        title = analysis["title"]
         
         # Store original_title separately - this will never change, even when user renames
         original_title = title
         
         # Create story record FIRST - ensure it's saved even if generation fails
-        story_id = create_story(user_id, title, story_input.prompt, genre, style, original_title)
+        created_at = _story_timestamp()
+        story_id = await asyncio.to_thread(create_story, user_id, title, story_input.prompt, genre, style, original_title, created_at)
         
         # Update memory
         memory.story_id = story_id
-        memory.add_message("user", story_input.prompt)
+        await asyncio.to_thread(memory.add_message, "user", story_input.prompt)
         
         # Log agent decision
-        log_agent_decision(story_id, "genre_classification", json.dumps(classification), 0.8)
+        await asyncio.to_thread(log_agent_decision, story_id, "genre_classification", _compact_json(classification), 0.8)
+        
+        summary = analysis["summary"]
+        try:
+            await asyncio.to_thread(set_metadata, story_id, "summary", summary)
+        except Exception as summary_error:
+            logger.warning("Summary save failed: %s", summary_error)
         
-        # Generate scenes (with error handling for rate limits)
+        # Wait for scenes (with error handling for rate limits)
         try:
-            scenes_data = scene_gen.generate_scenes(story_input.prompt)
+            scenes_data = await scenes_task
         except Exception as scene_error:
             error_msg = str(scene_error)
             # If scene generation fails due to quota, create a basic scene from prompt
-            if "quota" in error_msg.lower() or "429" in error_msg or "rate limit" in error_msg.lower() or "ResourceExhausted" in error_msg:
-                print(f"Scene generation failed due to quota: {scene_error}")
+            if is_rate_limit_error(error_msg):
+                logger.warning("Scene generation failed due to quota: %s", scene_error)
                 # Create a basic scene structure so story can still be saved
                 scenes_data = [{
                     "scene_number": 1,
@@ -191,50 +243,30 @@ async def generate_scenes(story_input: StoryInput, user_id: int = Depends(get_cu
             else:
                 raise
         
-        try:
-            patterns = analytics.detect_patterns(scenes_data)
-            log_agent_decision(story_id, "pattern_detection", json.dumps(patterns), patterns.get("visual_consistency_score", 0.7))
-        except Exception as pattern_error:
-            print(f"Pattern detection failed: {pattern_error}")
+        # Pattern detection runs while the scenes are written to the database
+        patterns_task = asyncio.create_task(analytics.adetect_patterns(scenes_data))
         
-        try:
-            summary = analytics.summarize(story_input.prompt, "story")
-            set_metadata(story_id, "summary", summary)
-        except Exception as summary_error:
-            print(f"Summary generation failed: {summary_error}")
-            summary = "Story summary unavailable"
+        # Calculate scores
+        confidence = 0.8  # Can be improved with actual scoring
+        scene_outputs = [SceneOutput(
+            scene_number=scene_data["scene_number"],
+            scene_text=scene_data["scene_text"],
+            cinematic_prompt=scene_data["cinematic_prompt"],
+            confidence_score=confidence,
+            completeness_score=min(1.0, len(scene_data["scene_text"]) / 100)
+        ) for scene_data in scenes_data]
         
-        # Save scenes to database
-        scene_outputs = []
-        for scene_data in scenes_data:
-            scene_id = create_scene(
-                story_id,
-                scene_data["scene_number"],
-                scene_data["scene_text"],
-                scene_data["cinematic_prompt"]
-            )
-            
-            # Calculate scores
-            confidence = 0.8  # Can be improved with actual scoring
-            completeness = min(1.0, len(scene_data["scene_text"]) / 100)
-            
-            scene_outputs.append(SceneOutput(
-                scene_number=scene_data["scene_number"],
-                scene_text=scene_data["scene_text"],
-                cinematic_prompt=scene_data["cinematic_prompt"],
-                confidence_score=confidence,
-                completeness_score=completeness
-            ))
+        # Save scenes and mark the story completed in a single transaction
+        await asyncio.to_thread(create_scenes_bulk, story_id, scenes_data)
         
-        # Update story status to completed
-        from src.database import get_db_connection
-        conn = get_db_connection()
-        conn.execute("UPDATE stories SET status = 'completed' WHERE id = ?", (story_id,))
-        conn.commit()
-        conn.close()
+        try:
+            patterns = await patterns_task
+            await asyncio.to_thread(log_agent_decision, story_id, "pattern_detection", _compact_json(patterns), patterns.get("visual_consistency_score", 0.7))
+        except Exception as pattern_error:
+            logger.warning("Pattern detection failed: %s", pattern_error)
         
         # Add assistant message to memory
-        memory.add_message("assistant", f"Generated {len(scene_outputs)} scenes")
+        await asyncio.to_thread(memory.add_message, "assistant", f"Generated {len(scene_outputs)} scenes")
         
         return StoryResponse(
             story_id=story_id,
@@ -245,24 +277,257 @@ async def generate_scenes(story_input: StoryInput, user_id: int = Depends(get_cu
             summary=summary,
             total_scenes=len(scene_outputs),
             status="completed",
-            created_at=datetime.now().isoformat(),
+            created_at=created_at,
             original_title=original_title  # Include original_title in response
         )
     
     except Exception as e:
+        # Don't leave background LLM calls running for a request that already failed
+        for task in (scenes_task, patterns_task):
+            if task and not task.done():
+                task.cancel()
         if story_id:
-            try:
-                from src.database import get_db_connection
-                conn = get_db_connection()
-                conn.execute("UPDATE stories SET status = 'failed' WHERE id = ?", (story_id,))
-                conn.commit()
-                conn.close()
-            except:
-                pass
+            await asyncio.to_thread(_mark_story_failed, story_id)
         
         raise HTTPException(status_code=500, detail=f"Error generating scenes: {str(e)}")
 
 
+def _story_timestamp() -> str:
+    """Now in UTC, formatted the way SQLite's CURRENT_TIMESTAMP stores it"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _compact_json(data) -> str:
+    """Serialize for storage/streaming without the default padding after separators"""
+    return json.dumps(data, separators=(",", ":"))
+
+
+# Longest wait for the next streamed scene before giving up on the LLM
+SCENE_STREAM_TIMEOUT_SECONDS = 30
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-run
+_background_tasks = set()
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {_compact_json(data)}\n\n"
+
+
+def _spawn_background(coro) -> asyncio.Task:
+    """Run a coroutine without awaiting it, keeping it referenced until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _mark_story_failed(story_id: int):
+    try:
+        update_story_status(story_id, "failed")
+    except:
+        pass
+
+
+async def _log_patterns(analytics: AnalyticsEngine, story_id: int, scenes_data: list):
+    try:
+        patterns = await analytics.adetect_patterns(scenes_data)
+        await asyncio.to_thread(log_agent_decision, story_id, "pattern_detection", _compact_json(patterns), patterns.get("visual_consistency_score", 0.7))
+    except Exception as pattern_error:
+        logger.warning("Pattern detection failed: %s", pattern_error)
+
+
+@app.post("/api/generate-scenes/stream")
+async def generate_scenes_stream(story_input: StoryInput, user_id: int = Depends(get_current_user)):
+    """Generate scenes from story prompt, streaming them as Server-Sent Events.
+
+    Emits `story` once the record exists, one `scene` per scene as the LLM produces it,
+    then `summary` and `done` (or `error`).
+    """
+    max_scenes = min(story_input.max_scenes, 8)
+    analytics = AnalyticsEngine()
+    memory = AgentMemory(user_id)
+    scene_gen = SceneGenerator(max_scenes=max_scenes)
+
+    async def _pump_scenes(scene_queue: asyncio.Queue):
+        """Feed scenes from the LLM stream into scene_queue, then None (or the exception that ended it)"""
+        scenes_iter = scene_gen.aiter_scenes(story_input.prompt)
+        try:
+            while True:
+                try:
+                    scene_data = await asyncio.wait_for(
+                        anext(scenes_iter, None),
+                        timeout=SCENE_STREAM_TIMEOUT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    raise TimeoutError(
+                        f"Scene generation timed out after {SCENE_STREAM_TIMEOUT_SECONDS} seconds waiting for the next scene"
+                    ) from None
+                scene_queue.put_nowait(scene_data)
+                if scene_data is None:
+                    return
+        except Exception as e:
+            scene_queue.put_nowait(e)
+        finally:
+            # Closing the iterator closes the underlying LLM stream
+            await scenes_iter.aclose()
+
+    async def _gen():
+        story_id = None
+        finished = False
+        persist_task = None
+        # Scene generation doesn't depend on the story analysis, so start streaming right away;
+        # scenes that arrive before the `story` event wait in the queue
+        scene_queue = asyncio.Queue()
+        pump_task = asyncio.create_task(_pump_scenes(scene_queue))
+        try:
+            preferences = await asyncio.to_thread(memory.get_user_preferences)
+            analysis = await analytics.aanalyze_story(story_input.prompt)
+            classification = {
+                "genre": analysis["genre"],
+                "style": analysis["style"],
+                "scene_type": analysis["scene_type"]
+            }
+            genre = classification.get("genre", "Drama")
+            style = story_input.style or preferences.get("preferred_style") or classification.get("style", "Cinematic")
+            title = analysis["title"]
+            original_title = title
+
+            created_at = _story_timestamp()
+            story_id = await asyncio.to_thread(create_story, user_id, title, story_input.prompt, genre, style, original_title, created_at)
+            memory.story_id = story_id
+            await asyncio.to_thread(memory.add_message, "user", story_input.prompt)
+            await asyncio.to_thread(log_agent_decision, story_id, "genre_classification", _compact_json(classification), 0.8)
+            yield _sse_event("story", {
+                "story_id": story_id,
+                "title": title,
+                "genre": genre,
+                "style": style,
+                "original_title": original_title
+            })
+
+            scenes_data = []
+            try:
+                while True:
+                    scene_data = await scene_queue.get()
+                    if scene_data is None:
+                        break
+                    if isinstance(scene_data, Exception):
+                        raise scene_data
+                    scenes_data.append(scene_data)
+                    scene = SceneOutput(
+                        scene_number=scene_data["scene_number"],
+                        scene_text=scene_data["scene_text"],
+                        cinematic_prompt=scene_data["cinematic_prompt"],
+                        confidence_score=0.8,
+                        completeness_score=min(1.0, len(scene_data["scene_text"]) / 100)
+                    )
+                    yield _sse_event("scene", scene.model_dump())
+            except Exception as scene_error:
+                error_msg = str(scene_error)
+                # Same quota fallback as the batch endpoint, but only if nothing was streamed yet
+                if scenes_data or not (isinstance(scene_error, TimeoutError) or is_rate_limit_error(error_msg)):
+                    raise
+                logger.warning("Scene generation failed due to quota: %s", scene_error)
+                scene_data = {
+                    "scene_number": 1,
+                    "scene_text": story_input.prompt[:200] + "..." if len(story_input.prompt) > 200 else story_input.prompt,
+                    "cinematic_prompt": f"Cinematic scene: {story_input.prompt[:150]}"
+                }
+                scenes_data.append(scene_data)
+                yield _sse_event("scene", SceneOutput(
+                    scene_number=1,
+                    scene_text=scene_data["scene_text"],
+                    cinematic_prompt=scene_data["cinematic_prompt"],
+                    confidence_score=0.8,
+                    completeness_score=min(1.0, len(scene_data["scene_text"]) / 100)
+                ).model_dump())
+
+            # Write scenes while the summary goes out; `done` waits so the images step can find them
+            persist_task = _spawn_background(asyncio.to_thread(create_scenes_bulk, story_id, scenes_data))
+            summary = analysis["summary"]
+            yield _sse_event("summary", {"summary": summary})
+            await persist_task
+            try:
+                await asyncio.to_thread(set_metadata, story_id, "summary", summary)
+            except Exception as summary_error:
+                logger.warning("Summary save failed: %s", summary_error)
+
+            _spawn_background(_log_patterns(analytics, story_id, scenes_data))
+
+            await asyncio.to_thread(memory.add_message, "assistant", f"Generated {len(scenes_data)} scenes")
+            finished = True
+            yield _sse_event("done", {
+                "story_id": story_id,
+                "total_scenes": len(scenes_data),
+                "status": "completed",
+                "created_at": created_at
+            })
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Error generating scenes: {str(e)}"})
+        finally:
+            pump_task.cancel()
+            # Also covers the client disconnecting mid-stream. The generator may be closing, so nothing
+            # is awaited: once the scenes insert has started, the story is only marked failed if it didn't commit
+            if story_id and not finished:
+                if persist_task is None:
+                    _spawn_background(asyncio.to_thread(_mark_story_failed, story_id))
+                else:
+                    def _after_persist(task: asyncio.Future, story_id=story_id):
+                        if task.cancelled() or task.exception() is not None:
+                            _spawn_background(asyncio.to_thread(_mark_story_failed, story_id))
+                    persist_task.add_done_callback(_after_persist)
+
+    return StreamingResponse(
+        _gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Overall budget per scene image, on top of the generator's own per-call timeout
+IMAGE_TIMEOUT_SECONDS = 300
+
+
+async def _generate_scene_image(image_gen: ImageGenerator, scene: dict):
+    """Generate one scene's image; returns (scene, path or exception)"""
+    scene_dict = {
+        "scene_number": scene["scene_number"],
+        "scene_text": scene["scene_text"],
+        "cinematic_prompt": scene["cinematic_prompt"]
+    }
+    try:
+        # Allows for retries inside the generator (3 attempts * 120s = up to 6 minutes),
+        # but we'll use 5 minutes to be safe
+        path = await asyncio.wait_for(
+            image_gen.agenerate_image_for_scene(scene_dict),
+            timeout=IMAGE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        return scene, Exception("Image generation timed out after 5 minutes (including retries)")
+    except Exception as e:
+        return scene, e
+    return scene, path
+
+
+def _file_version(path: str) -> str:
+    """Short content hash for cache-busting URLs; unlike a coarse mtime it changes whenever the image does"""
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _wait_for_scene_image(image_gen: ImageGenerator, scene: dict, outcome):
+    """Wait for a generated image's file to be written; returns (scene, path or exception)"""
+    if isinstance(outcome, Exception):
+        return scene, outcome
+    try:
+        await image_gen.wait_for_write(outcome)
+    except Exception as e:
+        return scene, e
+    return scene, outcome
+
+
 @app.post("/api/generate-images/{story_id}")
 async def generate_images(story_id: int, user_id: int = Depends(get_current_user)):
     """Generate images for scenes - handles rate limits gracefully"""
@@ -278,62 +543,45 @@ async def generate_images(story_id: int, user_id: int = Depends(get_current_user
     try:
         # Get style from story for image generation
         story_style = story.get("style", "Cinematic")
-        # Initialize ImageGenerator with story_id and style for unique filenames and style-appropriate images
-        image_gen = ImageGenerator(story_id=story_id, style=story_style)
+        # Initialize ImageGenerator with story_id and style for unique filenames and style-appropriate images.
+        # The first image anchors continuity so the remaining scenes can be generated in parallel.
+        image_gen = ImageGenerator(story_id=story_id, style=story_style, anchor_continuity=True)
         image_paths = []
         image_urls = []
         failed_scenes = []
         rate_limit_hit = False
         
-        for scene in scenes:
-            try:
-                scene_dict = {
-                    "scene_number": scene["scene_number"],
-                    "scene_text": scene["scene_text"],
-                    "cinematic_prompt": scene["cinematic_prompt"]
-                }
-                
-                # Add timeout wrapper to prevent hanging
-                import concurrent.futures
-                
-                # Run image generation with timeout
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(image_gen.generate_image_for_scene, scene_dict)
-                    try:
-                        # Increased timeout to allow for retries (3 attempts * 120s = up to 6 minutes)
-                        # But we'll use 5 minutes to be safe
-                        path = future.result(timeout=300)
-                    except concurrent.futures.TimeoutError:
-                        raise Exception("Image generation timed out after 5 minutes (including retries)")
-                    except Exception as e:
-                        raise e
-                
-                image_paths.append(path)
-                
-                # Convert path to URL - get just the filename
-                filename = os.path.basename(path)
-                image_url = f"/scene_images/{filename}"
-                image_urls.append(image_url)
-                
-                # Update scene with image path and URL
-                from src.database import get_db_connection
-                conn = get_db_connection()
-                conn.execute("UPDATE scenes SET image_path = ?, image_url = ? WHERE id = ?", 
-                            (path, image_url, scene["id"]))
-                conn.commit()
-                conn.close()
-                
-            except Exception as scene_error:
-                error_msg = str(scene_error)
-                print(f"Error generating image for scene {scene['scene_number']}: {error_msg}")
+        results = [await _generate_scene_image(image_gen, scenes[0])]
+        first_error = results[0][1] if isinstance(results[0][1], Exception) else None
+        if not (first_error and is_rate_limit_error(str(first_error))):
+            results += await asyncio.gather(*(_generate_scene_image(image_gen, scene) for scene in scenes[1:]))
+        
+        # Files are written in the background; make sure each one landed before recording it
+        results = [await _wait_for_scene_image(image_gen, scene, outcome) for scene, outcome in results]
+        
+        for scene, outcome in results:
+            if isinstance(outcome, Exception):
+                error_msg = str(outcome)
+                logger.warning("Error generating image for scene %s: %s", scene["scene_number"], error_msg, exc_info=outcome)
                 
                 # Check if it's a rate limit error
-                if "429" in error_msg or "rate limit" in error_msg.lower() or "throttled" in error_msg.lower() or "quota" in error_msg.lower():
+                if is_rate_limit_error(error_msg):
                     rate_limit_hit = True
-                    break
                 else:
                     failed_scenes.append(scene["scene_number"])
-                    continue
+                continue
+            
+            path = outcome
+            image_paths.append(path)
+            
+            # Convert path to URL - get just the filename. Regenerating reuses the filename,
+            # so a hash of the content versions the URL and browsers can cache it indefinitely
+            filename = os.path.basename(path)
+            image_url = f"/scene_images/{filename}?v={await asyncio.to_thread(_file_version, path)}"
+            image_urls.append(image_url)
+            
+            # Update scene with image path and URL
+            update_scene_image(scene["id"], path, image_url)
         
         # If rate limit was hit, return immediately with partial results
         if rate_limit_hit:
@@ -367,7 +615,7 @@ async def generate_images(story_id: int, user_id: int = Depends(get_current_user
     except Exception as e:
         error_msg = str(e)
         # Check if it's a rate limit error
-        if "429" in error_msg or "rate limit" in error_msg.lower() or "throttled" in error_msg.lower():
+        if is_rate_limit_error(error_msg):
             raise HTTPException(
                 status_code=429,
                 detail="Rate limit reached. Please wait a moment and try again. Your story is saved and you can generate images later."
@@ -406,26 +654,15 @@ class UpdatePasswordRequest(PydanticBaseModel):
 @app.get("/api/history/archived")
 async def get_archived_history(user_id: int = Depends(get_current_user)):
     """Get user's archived story history"""
-    from src.database import get_db_connection
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        # Get only archived stories
-        cursor.execute(
-            "SELECT * FROM stories WHERE user_id = ? AND archived = 1 ORDER BY created_at DESC",
-            (user_id,)
-        )
-        stories = [dict(row) for row in cursor.fetchall()]
-        return [{
-            "id": s["id"],
-            "title": s["title"],
-            "genre": s["genre"],
-            "style": s["style"],
-            "status": s["status"],
-            "created_at": s["created_at"]
-        } for s in stories]
-    finally:
-        conn.close()
+    stories = get_archived_stories(user_id)
+    return [{
+        "id": s["id"],
+        "title": s["title"],
+        "genre": s["genre"],
+        "style": s["style"],
+        "status": s["status"],
+        "created_at": s["created_at"]
+    } for s in stories]
 
 
 @app.put("/api/user/username")
@@ -457,7 +694,7 @@ async def update_password_endpoint(request: UpdatePasswordRequest, user_id: int
     if not request.password or len(request.password.strip()) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
     
-    success = update_user_password(user_id, request.password.strip())
+    success = await asyncio.to_thread(update_user_password, user_id, request.password.strip())
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update password")
     
@@ -538,23 +775,8 @@ async def unarchive_story_endpoint(
     return {"message": "Story unarchived successfully", "story_id": story_id}
 
 
-@app.get("/api/story/{story_id}/public")
-async def get_story_public(story_id: int):
-    """Get story details for sharing (public, no auth required)"""
-    from src.database import get_db_connection
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        # Get story without user_id check (for sharing)
-        cursor.execute("SELECT * FROM stories WHERE id = ?", (story_id,))
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Story not found")
-        story = dict(row)
-    finally:
-        conn.close()
-    
-    scenes_data = get_story_scenes(story_id)
+def _story_response(story: dict) -> StoryResponse:
+    """Build the API response from a fetch_story_bundle() result"""
     scenes = [SceneOutput(
         scene_number=s["scene_number"],
         scene_text=s["scene_text"],
@@ -563,12 +785,12 @@ async def get_story_public(story_id: int):
         image_url=s.get("image_url"),
         confidence_score=0.8,
         completeness_score=0.8
-    ) for s in scenes_data]
-    
-    from src.database import get_metadata
-    summary = get_metadata(story_id, "summary")
+    ) for s in story["scenes"]]
     
+    # Get original_title from database, fallback to title if not set (for old stories)
     original_title = story.get("original_title") or story["title"]
+    
+    # Get archived status
     archived_status = story.get("archived", 0)
     if archived_status is None:
         archived_status = 0
@@ -579,68 +801,40 @@ async def get_story_public(story_id: int):
         genre=story["genre"],
         style=story["style"],
         scenes=scenes,
-        summary=summary,
+        summary=story["summary"],
         user_prompt=story.get("user_prompt", ""),
         total_scenes=len(scenes),
         status=story["status"],
         created_at=story["created_at"],
-        original_title=original_title,
-        archived=archived_status
+        original_title=original_title,  # Include original_title in response
+        archived=archived_status  # Include archived status
     )
 
 
+@app.get("/api/story/{story_id}/public")
+async def get_story_public(story_id: int):
+    """Get story details for sharing (public, no auth required)"""
+    # Get story without user_id check (for sharing)
+    story = fetch_story_bundle(story_id)
+    if not story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    return _story_response(story)
+
+
 @app.get("/api/story/{story_id}", response_model=StoryResponse)
 async def get_story_details(story_id: int, user_id: int = Depends(get_current_user)):
     """Get full story details (requires authentication)"""
-    story = get_story(story_id, user_id)
+    story = fetch_story_bundle(story_id, user_id)
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
-    
-    scenes_data = get_story_scenes(story_id)
-    scenes = [SceneOutput(
-        scene_number=s["scene_number"],
-        scene_text=s["scene_text"],
-        cinematic_prompt=s["cinematic_prompt"],
-        image_path=s.get("image_path"),
-        image_url=s.get("image_url"),
-        confidence_score=0.8,
-        completeness_score=0.8
-    ) for s in scenes_data]
-    
-    from src.database import get_metadata
-    summary = get_metadata(story_id, "summary")
-    
-    # Get original_title from database, fallback to title if not set (for old stories)
-    original_title = story.get("original_title") or story["title"]
-    
-    # Get archived status
-    archived_status = story.get("archived", 0)
-    if archived_status is None:
-        archived_status = 0
-    
-    return StoryResponse(
-        story_id=story["id"],
-        title=story["title"],
-        genre=story["genre"],
-        style=story["style"],
-        scenes=scenes,
-        summary=summary,
-        user_prompt=story.get("user_prompt", ""),
-        total_scenes=len(scenes),
-        status=story["status"],
-        created_at=story["created_at"],
-        original_title=original_title,  # Include original_title in response
-        archived=archived_status  # Include archived status
-    )
+    return _story_response(story)
 
 
 # Query Endpoints
 @app.post("/api/search")
 async def search_stories(query: SearchQuery, user_id: int = Depends(get_current_user)):
     """Search stories by keywords"""
-    stories = get_user_stories(user_id)
-    # Simple keyword search (can be improved with full-text search)
-    results = [s for s in stories if query.query.lower() in s["title"].lower() or query.query.lower() in s.get("user_prompt", "").lower()]
+    results = search_user_stories(user_id, query.query)
     
     log_user_query(user_id, query.query, "search", len(results))
     
@@ -650,15 +844,15 @@ async def search_stories(query: SearchQuery, user_id: int = Depends(get_current_
 @app.post("/api/filter")
 async def filter_stories(filter_query: FilterQuery, user_id: int = Depends(get_current_user)):
     """Filter stories by genre, style, date"""
-    stories = get_user_stories(user_id)
-    results = stories
-    
-    if filter_query.genre:
-        results = [s for s in results if s.get("genre") == filter_query.genre]
-    if filter_query.style:
-        results = [s for s in results if s.get("style") == filter_query.style]
+    results = filter_user_stories(
+        user_id,
+        genre=filter_query.genre,
+        style=filter_query.style,
+        date_from=filter_query.date_from,
+        date_to=filter_query.date_to
+    )
     
-    log_user_query(user_id, json.dumps(filter_query.dict()), "filter", len(results))
+    log_user_query(user_id, json.dumps(filter_query.model_dump(mode="json")), "filter", len(results))
     
     return results
 
@@ -667,7 +861,7 @@ async def filter_stories(filter_query: FilterQuery, user_id: int = Depends(get_c
 async def categorize_story(request: CategorizeRequest, user_id: int = Depends(get_current_user)):
     """Categorize a story"""
     analytics = AnalyticsEngine()
-    classification = analytics.classify(request.story_text)
+    classification = await analytics.aclassify(request.story_text)
     
     log_user_query(user_id, request.story_text, "categorize", 1)
     
@@ -675,18 +869,16 @@ async def categorize_story(request: CategorizeRequest, user_id: int = Depends(ge
 
 
 # File Upload Endpoint
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
 @app.post("/api/upload-file")
 async def upload_file(file: UploadFile = File(...), user_id: int = Depends(get_current_user)):
     """Upload and extract text from file (PDF, DOCX, TXT, or Images)"""
-    import tempfile
-    import os
-    from pathlib import Path
-    
     # Validate file type
-    allowed_extensions = {'.pdf', '.docx', '.txt', '.jpg', '.jpeg', '.png'}
     file_ext = Path(file.filename).suffix.lower() if file.filename else ''
     
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_UPLOAD_EXTENSIONS:
         raise HTTPException(
             status_code=400,
             detail=f"File type not supported. Allowed types: PDF, DOCX, TXT, JPG, PNG"
@@ -696,28 +888,24 @@ async def upload_file(file: UploadFile = File(...), user_id: int = Depends(get_c
     file_type = file_ext[1:] if file_ext else "unknown"
     
     try:
-        # Read file content
-        contents = await file.read()
-        
+        # Parse straight from the upload's spooled temp file instead of copying it into memory;
+        # parsing runs off the event loop so large files don't block other requests
         if file_ext == '.pdf':
-            # Extract text from PDF
-            import PyPDF2
-            from io import BytesIO
-            pdf_file = BytesIO(contents)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            extracted_text = "\n".join([page.extract_text() for page in pdf_reader.pages])
+            # Extract text from PDF (large ones are split across worker processes)
+            extracted_text = await extract_pdf_text(file.file)
             
         elif file_ext == '.docx':
             # Extract text from DOCX
-            from docx import Document
-            from io import BytesIO
-            docx_file = BytesIO(contents)
-            doc = Document(docx_file)
-            extracted_text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            extracted_text = await asyncio.to_thread(extract_docx_text, file.file)
             
         elif file_ext == '.txt':
-            # Extract text from TXT
-            extracted_text = contents.decode('utf-8', errors='ignore')
+            # Extract text from TXT, decoding chunk by chunk
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            parts = []
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                parts.append(decoder.decode(chunk))
+            parts.append(decoder.decode(b'', final=True))
+            extracted_text = "".join(parts)
             
         elif file_ext in {'.jpg', '.jpeg', '.png'}:
             # For images, we'll use Google Vision API or return a message
@@ -748,7 +936,7 @@ async def upload_file(file: UploadFile = File(...), user_id: int = Depends(get_c
         
     except Exception as e:
         error_msg = str(e)
-        print(f"File upload error: {error_msg}")
+        logger.warning("File upload error: %s", error_msg, exc_info=e)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing file: {error_msg}"
@@ -761,9 +949,25 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+class VersionedStaticFiles(StaticFiles):
+    """StaticFiles that marks versioned (?v=...) URLs immutable.
+
+    Unversioned URLs keep Starlette's default mtime/size ETag revalidation.
+    """
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if "v" in QueryParams(scope.get("query_string", b"")):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+            # CORSMiddleware only answers requests that send Origin, and a plain <img>
+            # load doesn't - without this the year-long cache entry would lack ACAO
+            # and the PDF export's cross-origin fetch of the same URL would be refused
+            response.headers["Access-Control-Allow-Origin"] = "*"
+        return response
+
+
 # Serve static files (images) - Mount AFTER API routes to avoid conflicts
 if os.path.exists("scene_images"):
-    app.mount("/scene_images", StaticFiles(directory="scene_images"), name="scene_images")
+    app.mount("/scene_images", VersionedStaticFiles(directory="scene_images"), name="scene_images")
 if os.path.exists("output_scenes"):
     app.mount("/output_scenes", StaticFiles(directory="output_scenes"), name="output_scenes")
 if os.path.exists("suggestion"):
@@ -3,191 +3,397 @@ Database Operations using SQLAlchemy
 """
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Optional, List, Dict
 import hashlib
+import hmac
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
 
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'story_scenes.db')
 
 
+# journal_mode=WAL is stored in the database file and set once by init_db;
+# the rest are per-connection and applied every time one is opened
+CONNECTION_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA busy_timeout=5000;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+    PRAGMA foreign_keys=ON;
+"""
+
+
 def get_db_connection():
-    """Get SQLite database connection"""
+    """Get a standalone SQLite connection (for one-off work like init_db; helpers use the pools)"""
     os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
     conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
+    conn.executescript(CONNECTION_PRAGMAS)
+    return conn
+
+
+# Pooled connections shared across API requests: WAL lets any number of readers
+# run alongside the single writer, so only writes are serialized
+READ_POOL_SIZE = os.cpu_count() or 8
+_read_pool = queue.Queue(maxsize=READ_POOL_SIZE)
+_read_pool_lock = threading.Lock()
+_readers_opened = 0
+_write_conn = None
+_write_lock = threading.Lock()
+# Prepared statements kept per pooled connection, keyed by SQL text
+STATEMENT_CACHE_SIZE = 256
+# How long to wait for a pooled reader before opening a temporary one instead
+READ_POOL_TIMEOUT_SECONDS = 1.0
+
+
+def _py_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _open_pooled_connection(read_only: bool = False):
+    """Open a long-lived connection that may be handed between worker threads"""
+    os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+    if read_only:
+        uri = Path(DATABASE_PATH).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    else:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(CONNECTION_PRAGMAS)
+    # SQLite's lower() only folds ASCII; story search needs Python's Unicode lowercasing
+    conn.create_function("py_lower", 1, _py_lower, deterministic=True)
+    if read_only:
+        conn.execute("PRAGMA query_only=TRUE")
     return conn
 
 
+def _acquire_reader():
+    """Take a reader from the pool, opening one if the pool isn't full yet.
+
+    Returns (conn, pooled). If every reader stays checked out past the timeout a
+    temporary connection is opened, so a busy pool never blocks the caller for long.
+    """
+    global _readers_opened
+    try:
+        return _read_pool.get_nowait(), True
+    except queue.Empty:
+        pass
+    with _read_pool_lock:
+        can_open = _readers_opened < READ_POOL_SIZE
+        if can_open:
+            _readers_opened += 1
+    if not can_open:
+        # Every reader is checked out - wait briefly for one to come back
+        try:
+            return _read_pool.get(timeout=READ_POOL_TIMEOUT_SECONDS), True
+        except queue.Empty:
+            return _open_pooled_connection(read_only=True), False
+    try:
+        return _open_pooled_connection(read_only=True), True
+    except Exception:
+        with _read_pool_lock:
+            _readers_opened -= 1
+        raise
+
+
+@contextmanager
+def borrow_read():
+    """Use a read-only pooled connection for the duration of a with-block"""
+    conn, pooled = _acquire_reader()
+    try:
+        yield conn
+    finally:
+        if not pooled:
+            conn.close()
+        else:
+            # Ends the implicit read snapshot, if any
+            if conn.in_transaction:
+                conn.rollback()
+            _read_pool.put(conn)
+
+
+@contextmanager
+def borrow_write():
+    """Use the single writer connection inside a BEGIN IMMEDIATE transaction.
+
+    Taking the write lock up front means a transaction never fails with SQLITE_BUSY
+    halfway through upgrading from a read. Anything not committed is rolled back.
+    """
+    global _write_conn
+    with _write_lock:
+        if _write_conn is None:
+            _write_conn = _open_pooled_connection()
+        conn = _write_conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+
+def _stories_columns(cursor) -> List[str]:
+    cursor.execute("PRAGMA table_info(stories)")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _add_original_title(cursor):
+    # Databases from before migrations were tracked may already have the column
+    if "original_title" not in _stories_columns(cursor):
+        cursor.execute("ALTER TABLE stories ADD COLUMN original_title TEXT")
+        print("Added original_title column to stories table")
+
+
+def _backfill_original_title(cursor):
+    # For existing stories without original_title, set it to current title;
+    # create_story always sets it, so this only needs to happen once
+    cursor.execute("""
+        UPDATE stories 
+        SET original_title = title 
+        WHERE original_title IS NULL OR original_title = ''
+    """)
+    if cursor.rowcount > 0:
+        print(f"Updated {cursor.rowcount} existing stories with original_title")
+
+
+def _add_archived(cursor):
+    if "archived" not in _stories_columns(cursor):
+        cursor.execute("ALTER TABLE stories ADD COLUMN archived INTEGER DEFAULT 0")
+        print("Added archived column to stories table")
+
+
+def _drop_superseded_indexes(cursor):
+    # Replaced by the composite indexes in schema.sql
+    cursor.execute("DROP INDEX IF EXISTS idx_stories_user_id")
+    cursor.execute("DROP INDEX IF EXISTS idx_scenes_story_id")
+
+
+def _drop_stories_fts(cursor):
+    # Version 5 shipped this; kept so databases that had the FTS copy lose it
+    for trigger in ("stories_fts_insert", "stories_fts_delete", "stories_fts_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS stories_fts")
+
+
+def _analyze_indexes(cursor):
+    # Give the planner statistics for the composite indexes right away
+    cursor.execute("ANALYZE")
+
+
+# (version, migration) in the order they must run - append new ones, never renumber
+MIGRATIONS = [
+    (1, _add_original_title),
+    (2, _backfill_original_title),
+    (3, _add_archived),
+    (4, _drop_superseded_indexes),
+    (5, _drop_stories_fts),
+    (6, _analyze_indexes),
+]
+
+
 def init_db():
     """Initialize database with schema"""
     schema_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'schema.sql')
     conn = get_db_connection()
+    # Readers keep working while a writer commits, and commits skip the extra fsync
+    conn.execute("PRAGMA journal_mode=WAL")
     with open(schema_path, 'r') as f:
         conn.executescript(f.read())
     
-    # Migration: Add original_title column if it doesn't exist
+    # Run each migration once; schema_migrations records the ones already applied
     cursor = conn.cursor()
-    # Check if column exists
-    cursor.execute("PRAGMA table_info(stories)")
-    columns = [row[1] for row in cursor.fetchall()]
-    
-    if "original_title" not in columns:
+    applied = {row[0] for row in cursor.execute("SELECT version FROM schema_migrations")}
+    for version, migrate in MIGRATIONS:
+        if version in applied:
+            continue
         try:
-            cursor.execute("ALTER TABLE stories ADD COLUMN original_title TEXT")
+            migrate(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (?)", (version,))
             conn.commit()
-            print("Added original_title column to stories table")
-        except sqlite3.OperationalError as e:
-            print(f"Error adding original_title column: {e}")
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Migration {version} ({migrate.__name__}) failed: {e}")
     
-    # For existing stories without original_title, set it to current title
-    # This ensures old stories have an original_title value
-    try:
-        cursor.execute("""
-            UPDATE stories 
-            SET original_title = title 
-            WHERE original_title IS NULL OR original_title = ''
-        """)
-        conn.commit()
-        updated_count = cursor.rowcount
-        if updated_count > 0:
-            print(f"Updated {updated_count} existing stories with original_title")
-    except Exception as update_error:
-        pass
-    
-    if "archived" not in columns:
-        try:
-            cursor.execute("ALTER TABLE stories ADD COLUMN archived INTEGER DEFAULT 0")
-            conn.commit()
-            print("Added archived column to stories table")
-        except sqlite3.OperationalError as e:
-            print(f"Error adding archived column: {e}")
+    # Refresh stale planner statistics; 0x10000 checks every table, not only
+    # ones this fresh connection has queried (none)
+    cursor.execute("PRAGMA optimize=0x10002")
+    conn.commit()
     
     conn.close()
     print("Database initialized successfully")
 
+# Argon2id with the RFC 9106 low-memory profile (64 MiB, 3 passes, 4 lanes)
+_password_hasher = PasswordHasher(time_cost=3, memory_cost=64 * 1024, parallelism=4)
+
+
+def _is_legacy_hash(password_hash: str) -> bool:
+    """Accounts created before Argon2 store an unsalted SHA-256 hex digest"""
+    return len(password_hash) == 64 and all(c in "0123456789abcdef" for c in password_hash)
+
+
 def hash_password(password: str) -> str:
-    """Hash password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password using Argon2id"""
+    return _password_hasher.hash(password)
 
 def create_user(username: str, email: str, password: str) -> Optional[int]:
     """Create a new user"""
-    conn = get_db_connection()
-    try:
-        password_hash = hash_password(password)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
-            (username, email, password_hash)
-        )
-        user_id = cursor.lastrowid
-        conn.commit()
-        return user_id
-    except sqlite3.IntegrityError:
-        return None
-    finally:
-        conn.close()
+    password_hash = hash_password(password)
+    with borrow_write() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                (username, email, password_hash)
+            )
+            user_id = cursor.lastrowid
+            conn.commit()
+            return user_id
+        except sqlite3.IntegrityError:
+            return None
 
 def get_user_by_email(email: str) -> Optional[Dict]:
     """Get user by email"""
-    conn = get_db_connection()
-    try:
+    with borrow_read() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
         row = cursor.fetchone()
         if row:
             return dict(row)
         return None
-    finally:
-        conn.close()
 
 
 def get_user_by_id(user_id: int) -> Optional[Dict]:
     """Get user by ID"""
-    conn = get_db_connection()
-    try:
+    with borrow_read() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
         row = cursor.fetchone()
         if row:
             return dict(row)
         return None
-    finally:
-        conn.close()
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    """Verify password against hash"""
-    return hash_password(password) == password_hash
+    """Verify password against hash (Argon2id, or a legacy SHA-256 digest)"""
+    if _is_legacy_hash(password_hash):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), password_hash)
+    try:
+        return _password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """True for legacy SHA-256 hashes and Argon2 hashes made with outdated parameters"""
+    return _is_legacy_hash(password_hash) or _password_hasher.check_needs_rehash(password_hash)
 
 def update_user_username(user_id: int, new_username: str) -> bool:
     """Update user's username"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE users SET username = ? WHERE id = ?",
-            (new_username.strip(), user_id)
-        )
-        conn.commit()
-        return cursor.rowcount > 0
-    except sqlite3.IntegrityError:
-        # Username already exists
-        return False
-    finally:
-        conn.close()
+    with borrow_write() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE users SET username = ? WHERE id = ?",
+                (new_username.strip(), user_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.IntegrityError:
+            # Username already exists
+            return False
 
 def update_user_password(user_id: int, new_password: str) -> bool:
     """Update user's password"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        password_hash = hash_password(new_password)
-        cursor.execute(
-            "UPDATE users SET password_hash = ? WHERE id = ?",
-            (password_hash, user_id)
-        )
-        conn.commit()
-        return cursor.rowcount > 0
-    except Exception as e:
-        print(f"Error updating password: {e}")
-        return False
-    finally:
-        conn.close()
+    password_hash = hash_password(new_password)
+    with borrow_write() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE users SET password_hash = ? WHERE id = ?",
+                (password_hash, user_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Error updating password: {e}")
+            return False
 
 # Story Operations
-def create_story(user_id: int, title: str, user_prompt: str, genre: Optional[str] = None, style: Optional[str] = None, original_title: Optional[str] = None) -> int:
-    """Create a new story"""
-    conn = get_db_connection()
-    try:
+def create_story(user_id: int, title: str, user_prompt: str, genre: Optional[str] = None, style: Optional[str] = None, original_title: Optional[str] = None,
+                 created_at: Optional[str] = None) -> int:
+    """Create a new story (created_at defaults to CURRENT_TIMESTAMP)"""
+    with borrow_write() as conn:
         cursor = conn.cursor()
         # If original_title not provided, use title as original_title
         original_title = original_title or title
         cursor.execute(
-            "INSERT INTO stories (user_id, title, original_title, user_prompt, genre, style) VALUES (?, ?, ?, ?, ?, ?)",
-            (user_id, title, original_title, user_prompt, genre, style)
+            "INSERT INTO stories (user_id, title, original_title, user_prompt, genre, style, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+            (user_id, title, original_title, user_prompt, genre, style, created_at)
         )
         story_id = cursor.lastrowid
         conn.commit()
+        _invalidate_user_stories(user_id)
         return story_id
-    finally:
-        conn.close()
 
 def get_story(story_id: int, user_id: int) -> Optional[Dict]:
     """Get story by ID (user-specific)"""
-    conn = get_db_connection()
-    try:
+    with borrow_read() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM stories WHERE id = ? AND user_id = ?", (story_id, user_id))
         row = cursor.fetchone()
         if row:
             return dict(row)
         return None
-    finally:
-        conn.close()
+
+# Recent story lists per user, keyed by user_id then (limit, include_archived).
+# Writers that change a user's stories drop that user's entry.
+STORIES_CACHE_TTL_SECONDS = 10
+_stories_cache = TTLCache(maxsize=1024, ttl=STORIES_CACHE_TTL_SECONDS)
+_stories_cache_lock = threading.Lock()
+# Every invalidation takes the next sequence number, so a read that overlapped a
+# write doesn't cache its stale rows. Per-user marks only need to outlive the reads
+# in flight when they were set, so they expire instead of piling up.
+STORIES_INVALIDATION_TTL_SECONDS = 60
+_stories_seq = 0
+_stories_invalidated = TTLCache(maxsize=4096, ttl=STORIES_INVALIDATION_TTL_SECONDS)
+_stories_invalidated_all = 0
+
+
+def _invalidate_user_stories(user_id: Optional[int] = None):
+    """Forget cached story lists for one user, or for everyone if the owner isn't known"""
+    global _stories_seq, _stories_invalidated_all
+    with _stories_cache_lock:
+        _stories_seq += 1
+        if user_id is None:
+            _stories_cache.clear()
+            _stories_invalidated_all = _stories_seq
+        else:
+            _stories_cache.pop(user_id, None)
+            _stories_invalidated[user_id] = _stories_seq
+
+
+def _story_owner(cursor, story_id: int) -> Optional[int]:
+    row = cursor.execute("SELECT user_id FROM stories WHERE id = ?", (story_id,)).fetchone()
+    return row[0] if row else None
+
 
 def get_user_stories(user_id: int, limit: int = 50, include_archived: bool = False) -> List[Dict]:
     """Get all stories for a user (optionally include archived)"""
-    conn = get_db_connection()
-    try:
+    variant = (limit, include_archived)
+    with _stories_cache_lock:
+        cached = _stories_cache.get(user_id)
+        if cached is not None and variant in cached:
+            # Callers get their own copies, so editing a result can't corrupt the cache
+            return [dict(story) for story in cached[variant]]
+        read_seq = _stories_seq
+    
+    with borrow_read() as conn:
         cursor = conn.cursor()
         if include_archived:
             cursor.execute(
@@ -199,14 +405,69 @@ def get_user_stories(user_id: int, limit: int = 50, include_archived: bool = Fal
                 "SELECT * FROM stories WHERE user_id = ? AND (archived = 0 OR archived IS NULL) ORDER BY created_at DESC LIMIT ?",
                 (user_id, limit)
             )
+        stories = [dict(row) for row in cursor.fetchall()]
+    
+    with _stories_cache_lock:
+        if max(_stories_invalidated_all, _stories_invalidated.get(user_id, 0)) <= read_seq:
+            _stories_cache.setdefault(user_id, {})[variant] = [dict(story) for story in stories]
+    return stories
+
+def get_archived_stories(user_id: int) -> List[Dict]:
+    """Get a user's archived stories, newest first"""
+    with borrow_read() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM stories WHERE user_id = ? AND archived = 1 ORDER BY created_at DESC",
+            (user_id,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+def search_user_stories(user_id: int, query: str, limit: int = 50) -> List[Dict]:
+    """Case-insensitive substring search over a user's (non-archived) story titles and prompts, newest first"""
+    needle = query.lower()
+    with borrow_read() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT * FROM stories
+               WHERE user_id = ? AND (archived = 0 OR archived IS NULL)
+               AND (instr(py_lower(title), ?) > 0 OR instr(py_lower(user_prompt), ?) > 0)
+               ORDER BY created_at DESC LIMIT ?""",
+            (user_id, needle, needle, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+def filter_user_stories(user_id: int, genre: Optional[str] = None, style: Optional[str] = None,
+                        date_from: Optional[str] = None, date_to: Optional[str] = None,
+                        limit: int = 50) -> List[Dict]:
+    """Get a user's (non-archived) stories matching every given field"""
+    clauses = ["user_id = ?", "(archived = 0 OR archived IS NULL)"]
+    params = [user_id]
+    if genre:
+        clauses.append("genre = ?")
+        params.append(genre)
+    if style:
+        clauses.append("style = ?")
+        params.append(style)
+    # A date SQLite can't parse is ignored rather than matching nothing
+    if date_from:
+        clauses.append("(date(?) IS NULL OR created_at >= date(?))")
+        params += [date_from, date_from]
+    if date_to:
+        # Inclusive of the whole end day
+        clauses.append("(date(?) IS NULL OR created_at < date(?, '+1 day'))")
+        params += [date_to, date_to]
+    params.append(limit)
+    with borrow_read() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT * FROM stories WHERE {' AND '.join(clauses)} ORDER BY created_at DESC LIMIT ?",
+            params
+        )
         return [dict(row) for row in cursor.fetchall()]
-    finally:
-        conn.close()
 
 def update_story(story_id: int, user_id: int, title: Optional[str] = None) -> bool:
     """Update story title"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         if title:
             cursor.execute(
@@ -214,44 +475,49 @@ def update_story(story_id: int, user_id: int, title: Optional[str] = None) -> bo
                 (title, story_id, user_id)
             )
         conn.commit()
+        _invalidate_user_stories(user_id)
         return cursor.rowcount > 0
-    finally:
-        conn.close()
 
 def archive_story(story_id: int, user_id: int, archived: bool = True) -> bool:
     """Archive or unarchive a story"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE stories SET archived = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?",
             (1 if archived else 0, story_id, user_id)
         )
         conn.commit()
+        _invalidate_user_stories(user_id)
+        return cursor.rowcount > 0
+
+def update_story_status(story_id: int, status: str) -> bool:
+    """Set a story's generation status (processing, completed, failed)"""
+    with borrow_write() as conn:
+        cursor = conn.cursor()
+        owner = _story_owner(cursor, story_id)
+        cursor.execute("UPDATE stories SET status = ? WHERE id = ?", (status, story_id))
+        conn.commit()
+        if owner is not None:
+            _invalidate_user_stories(owner)
         return cursor.rowcount > 0
-    finally:
-        conn.close()
 
 def delete_story(story_id: int, user_id: int) -> bool:
     """Delete a story and all its scenes"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         # Delete scenes first (foreign key constraint)
         cursor.execute("DELETE FROM scenes WHERE story_id = ?", (story_id,))
         # Delete story
         cursor.execute("DELETE FROM stories WHERE id = ? AND user_id = ?", (story_id, user_id))
         conn.commit()
+        _invalidate_user_stories(user_id)
         return cursor.rowcount > 0
-    finally:
-        conn.close()
 
 # Scene Operations
 def create_scene(story_id: int, scene_number: int, scene_text: str, cinematic_prompt: str, 
                  image_path: Optional[str] = None, image_url: Optional[str] = None) -> int:
     """Create a scene"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """INSERT INTO scenes (story_id, scene_number, scene_text, cinematic_prompt, image_path, image_url)
@@ -261,38 +527,93 @@ def create_scene(story_id: int, scene_number: int, scene_text: str, cinematic_pr
         scene_id = cursor.lastrowid
         conn.commit()
         return scene_id
-    finally:
-        conn.close()
+
+def create_scenes_bulk(story_id: int, scenes: List[Dict]) -> List[int]:
+    """Insert all scenes of a story and mark it completed in one transaction"""
+    with borrow_write() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            """INSERT INTO scenes (story_id, scene_number, scene_text, cinematic_prompt, image_path, image_url)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(story_id, s["scene_number"], s["scene_text"], s["cinematic_prompt"], s.get("image_path"), s.get("image_url"))
+             for s in scenes]
+        )
+        cursor.execute("UPDATE stories SET status = 'completed' WHERE id = ?", (story_id,))
+        owner = _story_owner(cursor, story_id)
+        # Ids are consecutive because the inserts share one write transaction;
+        # cursor.lastrowid isn't updated by executemany, so ask SQLite directly
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.commit()
+        if owner is not None:
+            _invalidate_user_stories(owner)
+        return list(range(last_id - len(scenes) + 1, last_id + 1))
+
+def update_scene_image(scene_id: int, image_path: str, image_url: str) -> bool:
+    """Attach a generated image to a scene"""
+    with borrow_write() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE scenes SET image_path = ?, image_url = ? WHERE id = ?",
+            (image_path, image_url, scene_id)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
 
 def get_story_scenes(story_id: int) -> List[Dict]:
     """Get all scenes for a story"""
-    conn = get_db_connection()
-    try:
+    with borrow_read() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM scenes WHERE story_id = ? ORDER BY scene_number", (story_id,))
         return [dict(row) for row in cursor.fetchall()]
-    finally:
-        conn.close()
+
+def fetch_story_bundle(story_id: int, user_id: Optional[int] = None) -> Optional[Dict]:
+    """Get a story with its scenes and summary in one query (user-specific unless user_id is None)"""
+    sql = """
+        SELECT s.*,
+               sc.id AS scene_id, sc.scene_number, sc.scene_text, sc.cinematic_prompt,
+               sc.image_path, sc.image_url,
+               (SELECT m.value FROM metadata m
+                WHERE m.story_id = s.id AND m.key = 'summary'
+                ORDER BY m.id LIMIT 1) AS summary
+        FROM stories s
+        LEFT JOIN scenes sc ON sc.story_id = s.id
+        WHERE s.id = ?
+    """
+    params = [story_id]
+    if user_id is not None:
+        sql += " AND s.user_id = ?"
+        params.append(user_id)
+    sql += " ORDER BY sc.scene_number"
+    with borrow_read() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    
+    scene_columns = ("scene_number", "scene_text", "cinematic_prompt", "image_path", "image_url")
+    story = {key: rows[0][key] for key in rows[0].keys() if key not in scene_columns and key != "scene_id"}
+    story["scenes"] = [
+        dict({"id": row["scene_id"]}, **{key: row[key] for key in scene_columns})
+        for row in rows if row["scene_id"] is not None
+    ]
+    return story
 
 # Conversation Operations
 def add_conversation(story_id: Optional[int], user_id: int, role: str, message: str):
     """Add a conversation message"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO conversations (story_id, user_id, role, message) VALUES (?, ?, ?, ?)",
             (story_id, user_id, role, message)
         )
         conn.commit()
-    finally:
-        conn.close()
 
 # Agent Decision Operations
 def log_agent_decision(story_id: int, decision_type: str, decision_data: str, confidence_score: Optional[float] = None):
     """Log an agent decision"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """INSERT INTO agent_decisions (story_id, decision_type, decision_data, confidence_score)
@@ -300,28 +621,22 @@ def log_agent_decision(story_id: int, decision_type: str, decision_data: str, co
             (story_id, decision_type, decision_data, confidence_score)
         )
         conn.commit()
-    finally:
-        conn.close()
 
 # Query Operations
 def log_user_query(user_id: int, query_text: str, query_type: str, results_count: int):
     """Log a user query"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO user_queries (user_id, query_text, query_type, results_count) VALUES (?, ?, ?, ?)",
             (user_id, query_text, query_type, results_count)
         )
         conn.commit()
-    finally:
-        conn.close()
 
 # Report Operations
 def create_report(story_id: int, report_type: str, report_data: str) -> int:
     """Create a report"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO reports (story_id, report_type, report_data) VALUES (?, ?, ?)",
@@ -330,32 +645,24 @@ def create_report(story_id: int, report_type: str, report_data: str) -> int:
         report_id = cursor.lastrowid
         conn.commit()
         return report_id
-    finally:
-        conn.close()
 
 # Metadata Operations
 def set_metadata(story_id: int, key: str, value: str):
     """Set metadata for a story"""
-    conn = get_db_connection()
-    try:
+    with borrow_write() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO metadata (story_id, key, value) VALUES (?, ?, ?)",
             (story_id, key, value)
         )
         conn.commit()
-    finally:
-        conn.close()
 
 def get_metadata(story_id: int, key: str) -> Optional[str]:
     """Get metadata for a story"""
-    conn = get_db_connection()
-    try:
+    with borrow_read() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT value FROM metadata WHERE story_id = ? AND key = ?", (story_id, key))
         row = cursor.fetchone()
         if row:
             return row[0]
         return None
-    finally:
-        conn.close()
\ No newline at end of file
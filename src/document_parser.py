@@ -0,0 +1,94 @@
+"""
+Text Extraction for Uploaded Documents
+
+Kept free of app imports so process-pool workers can load it cheaply.
+"""
+import os
+import shutil
+import asyncio
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+# Optional parsers: imported once here rather than per request
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+try:
+    from docx import Document
+except ImportError:
+    Document = None
+
+# Below this many pages handing work to other processes costs more than it saves
+PARALLEL_MIN_PAGES = 16
+PDF_WORKERS = os.cpu_count() or 1
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        # Spawn rather than fork: the server process carries threads whose locks a fork would inherit
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Worker: open the PDF and extract pages [start, stop)"""
+    pdf_reader = PyPDF2.PdfReader(path)
+    return [pdf_reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def extract_docx_text(fileobj) -> str:
+    if Document is None:
+        raise ImportError("python-docx is required to read DOCX files")
+    doc = Document(fileobj)
+    return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+
+
+async def extract_pdf_text(fileobj) -> str:
+    """Extract PDF text, splitting large documents across worker processes"""
+    if PyPDF2 is None:
+        raise ImportError("PyPDF2 is required to read PDF files")
+    pdf_reader = await asyncio.to_thread(PyPDF2.PdfReader, fileobj)
+    page_count = len(pdf_reader.pages)
+    workers = min(PDF_WORKERS, page_count // PARALLEL_MIN_PAGES)
+    if workers < 2:
+        return await asyncio.to_thread(
+            lambda: "\n".join([page.extract_text() for page in pdf_reader.pages])
+        )
+
+    # Workers can't share the upload's file object, so give them a path to reopen
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        path = tmp.name
+    try:
+        def _copy():
+            fileobj.seek(0)
+            with open(path, "wb") as out:
+                shutil.copyfileobj(fileobj, out)
+        await asyncio.to_thread(_copy)
+
+        # One contiguous page range per worker, so each opens the file once
+        step = -(-page_count // workers)
+        loop = asyncio.get_running_loop()
+        pool = _get_pdf_pool()
+        chunks = await asyncio.gather(*[
+            loop.run_in_executor(pool, _extract_page_range, path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ])
+    finally:
+        os.remove(path)
+
+    return "\n".join(text for chunk in chunks for text in chunk)
@@ -1,6 +1,6 @@
 import os
-import threading
-import queue
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Union
 from io import BytesIO
 
@@ -18,23 +18,37 @@ genai_client = genai.Client(api_key=google_api_key)
 OUTPUT_DIR = "scene_images"
 IMAGE_EXT = "png"
 IMAGE_GENERATION_MODEL = "gemini-2.5-flash-image"
+IMAGE_TIMEOUT_SECONDS = 120
+REFERENCE_MAX_EDGE = 768  # The continuity hint doesn't need the full-resolution image
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Image files are written here so the disk work overlaps the next API call
+_write_executor = ThreadPoolExecutor(max_workers=2)
+
 class ImageGenerator:
     def __init__(
         self,
         output_dir: str = OUTPUT_DIR,
         story_id: int | None = None,
         style: str = "Cinematic",
+        anchor_continuity: bool = False,
     ):
         self.output_dir = output_dir
         self.story_id = story_id
         self.style = style
         self.aspect_ratio = "3:4"
 
-        # ALWAYS real Pillow image
+        # Chain each scene to the previous one, or (anchor_continuity) keep the
+        # first image as the reference so later scenes can run concurrently
+        self.anchor_continuity = anchor_continuity
+
+        # Pillow image of the current reference (lazily decoded from the response bytes)
         self.previous_image: Image.Image | None = None
+        # previous_image encoded once as a downscaled JPEG for the continuity part
+        self._previous_image_jpeg: bytes | None = None
+        # Background writes still in flight, by file path
+        self._pending_writes: Dict[str, Future] = {}
 
     def _get_style_prompt(self) -> str:
         styles = {
@@ -47,20 +61,65 @@ class ImageGenerator:
         return f"Style: {styles.get(self.style.lower(), self.style)}"
 
     def generate_image_for_scene(self, scene: Dict) -> str:
+        """Blocking wrapper over agenerate_image_for_scene for callers without an event loop
+
+        Returns once the image is on disk.
+        """
+        async def generate() -> str:
+            file_path = await self.agenerate_image_for_scene(scene)
+            await self.wait_for_write(file_path)
+            return file_path
+        return asyncio.run(generate())
+
+    async def wait_for_write(self, file_path: str):
+        """Wait until the image at file_path is on disk; re-raises a failed write"""
+        future = self._pending_writes.pop(file_path, None)
+        if future is not None:
+            await asyncio.wrap_future(future)
+
+    async def agenerate_image_for_scene(self, scene: Dict) -> str:
+        contents, file_path = self._build_request(scene)
+        try:
+            response = await asyncio.wait_for(
+                genai_client.aio.models.generate_content(
+                    model=IMAGE_GENERATION_MODEL,
+                    contents=contents,
+                    config=self._image_config(),
+                ),
+                timeout=IMAGE_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError("Image generation timeout")
+
+        inline_data = self._image_part(response)
+        img_bytes = inline_data.data
+
+        # Callers use wait_for_write before reading the file back
+        self._pending_writes[file_path] = _write_executor.submit(
+            self._write_image, img_bytes, inline_data.mime_type, file_path
+        )
+
+        # Only the continuity reference has to be ready before the next scene starts
+        if self._needs_reference():
+            self.previous_image, self._previous_image_jpeg = await asyncio.to_thread(
+                self._decode_reference, img_bytes
+            )
+
+        print(f"Generated {file_path} ({len(img_bytes)} bytes)")
+        return file_path
+
+    def _build_request(self, scene: Dict):
+        """Returns (contents, file_path) for a scene"""
         prompt = scene.get("cinematic_prompt") or scene.get("scene_text", "")
         if not prompt.strip():
             raise ValueError("Empty scene prompt")
 
         contents: List[Union[str, types.Part]] = []
 
-        if self.previous_image:
-            buffer = BytesIO()
-            self.previous_image.save(buffer, format="JPEG")
-            buffer.seek(0)
-
+        if self._previous_image_jpeg:
             contents.append(
                 types.Part.from_bytes(
-                    data=buffer.read(),
+                    data=self._previous_image_jpeg,
                     mime_type="image/jpeg",
                 )
             )
@@ -78,55 +137,44 @@ class ImageGenerator:
             if self.story_id
             else f"scene_{scene_number:02d}.{IMAGE_EXT}"
         )
-        file_path = os.path.join(self.output_dir, filename)
-
-        return self._generate_image(contents, file_path)
+        return contents, os.path.join(self.output_dir, filename)
 
-    def _generate_image(self, contents, file_path) -> str:
-        result_q = queue.Queue()
-        error_q = queue.Queue()
-
-        def worker():
-            try:
-                config = types.GenerateContentConfig(
-                    response_modalities=["IMAGE"],
-                    image_config=types.ImageConfig(aspect_ratio=self.aspect_ratio),
-                )
-
-                response = genai_client.models.generate_content(
-                    model=IMAGE_GENERATION_MODEL,
-                    contents=contents,
-                    config=config,
-                )
-                result_q.put(response)
-            except Exception as e:
-                error_q.put(e)
-
-        t = threading.Thread(target=worker, daemon=True)
-        t.start()
-        t.join(timeout=120)
-
-        if t.is_alive():
-            raise TimeoutError("Image generation timeout")
-
-        if not error_q.empty():
-            raise error_q.get()
-
-        response = result_q.get()
-
-        pil_image = None
+    def _image_config(self) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            response_modalities=["IMAGE"],
+            image_config=types.ImageConfig(aspect_ratio=self.aspect_ratio),
+        )
 
-        for part in response.parts:
-            if part.inline_data:
-                img_bytes = part.inline_data.data
-                pil_image = Image.open(BytesIO(img_bytes)).convert("RGB")
-                break
+    def _needs_reference(self) -> bool:
+        return self.previous_image is None or not self.anchor_continuity
 
-        if pil_image is None:
+    @staticmethod
+    def _image_part(response):
+        inline_data = next((part.inline_data for part in response.parts if part.inline_data), None)
+        if inline_data is None:
             raise RuntimeError("No image returned")
-
-        pil_image.save(file_path)
-        self.previous_image = pil_image
-
-        print(f"Saved {file_path} ({os.path.getsize(file_path)} bytes)")
-        return file_path
\ No newline at end of file
+        return inline_data
+
+    @staticmethod
+    def _write_image(img_bytes: bytes, mime_type: str, file_path: str):
+        if mime_type == f"image/{IMAGE_EXT}":
+            # Already in the on-disk format: write the bytes through instead of decoding and re-encoding
+            with open(file_path, "wb") as f:
+                f.write(img_bytes)
+        else:
+            Image.open(BytesIO(img_bytes)).convert("RGB").save(file_path)
+
+    @classmethod
+    def _decode_reference(cls, img_bytes: bytes):
+        """Returns (image, downscaled JPEG bytes) for the continuity part"""
+        pil_image = Image.open(BytesIO(img_bytes))
+        return pil_image, cls._encode_reference(pil_image)
+
+    @staticmethod
+    def _encode_reference(pil_image: Image.Image) -> bytes:
+        reference = pil_image.copy()
+        reference.thumbnail((REFERENCE_MAX_EDGE, REFERENCE_MAX_EDGE))
+        buffer = BytesIO()
+        # Passed-through PNGs may carry alpha, which JPEG can't store
+        reference.convert("RGB").save(buffer, format="JPEG")
+        return buffer.getvalue()
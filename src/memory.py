@@ -1,17 +1,22 @@
 """
 Agent Memory: Conversation and Long-term Memory
 """
-from typing import List, Dict, Optional
+from collections import Counter, deque
+from itertools import islice
+from typing import Dict, Optional
 from src.database import (
     add_conversation, set_metadata,
     get_user_stories, get_story_scenes
 )
 
+# Only the recent tail is read back; the database keeps the full conversation
+CONVERSATION_HISTORY_LIMIT = 200
+
 class AgentMemory:
     def __init__(self, user_id: int, story_id: Optional[int] = None):
         self.user_id = user_id
         self.story_id = story_id
-        self.conversation_history: List[Dict] = []
+        self.conversation_history: deque[Dict] = deque(maxlen=CONVERSATION_HISTORY_LIMIT)
     
     def add_message(self, role: str, message: str):
         """Add a message to conversation memory"""
@@ -21,9 +26,9 @@ class AgentMemory:
     
     def get_conversation_context(self, limit: int = 10) -> str:
         """Get recent conversation context as string"""
-        recent = self.conversation_history[-limit:] if len(self.conversation_history) > limit else self.conversation_history
-        context = "\n".join([f"{msg['role']}: {msg['message']}" for msg in recent])
-        return context
+        # Walk back from the newest entry so only `limit` messages are touched
+        recent = list(islice(reversed(self.conversation_history), limit))
+        return "\n".join(f"{msg['role']}: {msg['message']}" for msg in reversed(recent))
     
     def get_user_preferences(self) -> Dict:
         """Get user preferences from long-term memory"""
@@ -36,13 +41,19 @@ class AgentMemory:
         }
         
         if past_stories:
-            styles = [s.get("style") for s in past_stories if s.get("style")]
-            genres = [s.get("genre") for s in past_stories if s.get("genre")]
+            styles = Counter()
+            genres = Counter()
+            for s in past_stories:
+                if s.get("style"):
+                    styles[s["style"]] += 1
+                if s.get("genre"):
+                    genres[s["genre"]] += 1
             
+            # Ties go to the most recent story, since past_stories is newest first
             if styles:
-                preferences["preferred_style"] = max(set(styles), key=styles.count)
+                preferences["preferred_style"] = styles.most_common(1)[0][0]
             if genres:
-                preferences["preferred_genre"] = max(set(genres), key=genres.count)
+                preferences["preferred_genre"] = genres.most_common(1)[0][0]
         
         return preferences
     
@@ -1,9 +1,12 @@
 """
 Pydantic Models for Validation
 """
+import re
 from pydantic import BaseModel, Field, EmailStr, validator
 from typing import Optional, List
 
+_USERNAME_RE = re.compile(r'[A-Za-z0-9_]+')
+
 # Authentication Models
 class UserRegister(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -12,9 +15,9 @@ class UserRegister(BaseModel):
     
     @validator('username')
     def validate_username(cls, v):
-        if not v.isalnum() and '_' not in v:
+        if not _USERNAME_RE.fullmatch(v):
             raise ValueError('Username must contain only letters, numbers, and underscores')
-        return v.strip()
+        return v
 
 
 class UserLogin(BaseModel):
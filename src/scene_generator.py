@@ -1,18 +1,25 @@
 import os
 import json
 import re
-from typing import List, Dict
+import asyncio
+from typing import AsyncIterator, List, Dict
+import orjson
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
-import threading
-import queue
 
 load_dotenv()
 
 OUTPUT_DIR = "output_scenes"
 SCENES_FILE = "scenes.json"
 MAX_SCENES = 8
+SCENE_TIMEOUT_SECONDS = 30  # Stop waiting on the LLM once the quota is likely exhausted
+
+# Error text from Gemini / Imagen that means we hit a rate limit or quota
+_RATE_LIMIT_RE = re.compile(r'429|rate.?limit|throttled|quota|resourceexhausted', re.IGNORECASE)
+# Markdown code fences the model sometimes wraps around JSON
+_FENCE_OPEN_RE = re.compile(r'^```(?:json)?\s*')
+_FENCE_CLOSE_RE = re.compile(r'\s*```$')
 
 def ensure_output_dir(path: str):
     os.makedirs(path, exist_ok=True)
@@ -20,12 +27,56 @@ def ensure_output_dir(path: str):
 def clean_json_response(response_text: str) -> str:
     """Clean JSON response from LLM (remove markdown code blocks)"""
     response_text = response_text.strip()
-    # Remove markdown code blocks
+    # Remove markdown code blocks (clean JSON never reaches the regexes)
     if response_text.startswith("```"):
-        response_text = re.sub(r'^```(?:json)?\s*', '', response_text)
-        response_text = re.sub(r'\s*```$', '', response_text)
+        response_text = _FENCE_OPEN_RE.sub('', response_text)
+        response_text = _FENCE_CLOSE_RE.sub('', response_text)
     return response_text.strip()
 
+def is_rate_limit_error(error_msg: str) -> bool:
+    """Check if an LLM or image API error means we were rate limited"""
+    return _RATE_LIMIT_RE.search(error_msg) is not None
+
+def _quota_error(e: Exception):
+    """The exception to raise instead of e if it's a Gemini rate limit/quota error, else None"""
+    error_msg = str(e)
+    if is_rate_limit_error(error_msg):
+        return Exception(f"API quota exceeded: {error_msg}")
+    return None
+
+class _SceneStreamDecoder:
+    """Decodes scene objects out of a JSON list as its text arrives in chunks"""
+
+    def __init__(self, max_scenes: int):
+        self.max_scenes = max_scenes
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = None  # Index just after the opening '[' once it has arrived
+        self.count = 0
+
+    def feed(self, text: str) -> List[Dict]:
+        """Add a chunk of text; returns the scenes it completed"""
+        self.buffer += text
+        scenes = []
+        if self.pos is None:
+            start = self.buffer.find("[")
+            if start == -1:
+                return scenes
+            self.pos = start + 1
+        # Decode every complete scene object received so far
+        while self.count < self.max_scenes:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n,":
+                self.pos += 1
+            if self.pos >= len(self.buffer) or self.buffer[self.pos] != "{":
+                break
+            try:
+                scene, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                break  # Object not complete yet
+            self.count += 1
+            scenes.append(scene)
+        return scenes
+
 class SceneGenerator:
     def __init__(self, model_name: str = "gemini-2.5-flash", max_scenes: int = MAX_SCENES):
         # Configure LLM with no retries on rate limits - stop immediately on 429 errors
@@ -52,54 +103,52 @@ class SceneGenerator:
         )
 
     def generate_scenes(self, story: str) -> List[Dict]:
+        """Blocking wrapper over agenerate_scenes for callers without an event loop"""
+        return asyncio.run(self.agenerate_scenes(story))
+
+    async def agenerate_scenes(self, story: str) -> List[Dict]:
         prompt = self.template.format(story=story, max_scenes=self.max_scenes)
 
-        # Use threading with timeout to prevent infinite retries on rate limits
-        result_queue = queue.Queue()
-        exception_queue = queue.Queue()
-        max_wait_time = 30  # 30 second timeout for scene generation
-        
-        def run_llm():
-            try:
-                response_text = self.llm.predict(prompt)
-                result_queue.put(response_text)
-            except Exception as e:
-                exception_queue.put(e)
-        
-        # Start LLM call in a thread
-        thread = threading.Thread(target=run_llm, daemon=True)
-        thread.start()
-        thread.join(timeout=max_wait_time)
-        
-        # Check if thread is still running (timeout occurred)
-        if thread.is_alive():
-            raise Exception(f"Scene generation timed out after {max_wait_time} seconds. API quota may be exceeded.")
-        
-        # Check for exceptions
-        if not exception_queue.empty():
-            e = exception_queue.get()
-            error_msg = str(e)
-            # Check for rate limit/quota errors
-            if "429" in error_msg or "quota" in error_msg.lower() or "rate limit" in error_msg.lower() or "ResourceExhausted" in error_msg:
-                raise Exception(f"API quota exceeded: {error_msg}")
-            raise e
-        
-        # Get result
-        if result_queue.empty():
-            raise Exception("Scene generation failed - no result returned")
-        
-        response_text = result_queue.get()
-        
+        # Enforce the timeout on the coroutine itself to prevent infinite retries on rate limits
+        try:
+            response = await asyncio.wait_for(self.llm.ainvoke(prompt), timeout=SCENE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise Exception(f"Scene generation timed out after {SCENE_TIMEOUT_SECONDS} seconds. API quota may be exceeded.")
+        except Exception as e:
+            raise _quota_error(e) or e
+
+        return self._parse_scenes(response.content, story)
+
+    async def aiter_scenes(self, story: str) -> AsyncIterator[Dict]:
+        """Yield scenes one by one while the LLM is still streaming its JSON list.
+
+        Closing the iterator (or cancelling a pending step) closes the LLM stream.
+        """
+        prompt = self.template.format(story=story, max_scenes=self.max_scenes)
+        stream = _SceneStreamDecoder(self.max_scenes)
+        try:
+            async for chunk in self.llm.astream(prompt):
+                for scene in stream.feed(chunk.content or ""):
+                    yield scene
+        except Exception as e:
+            raise _quota_error(e) or e
+
+        # Nothing could be decoded incrementally - fall back to parsing the whole response
+        if stream.count == 0:
+            for scene in self._parse_scenes(stream.buffer, story):
+                yield scene
+
+    def _parse_scenes(self, response_text: str, story: str) -> List[Dict]:
         # Clean the response
         response_text = clean_json_response(response_text)
         
         try:
-            scenes = json.loads(response_text)
-        except json.JSONDecodeError:
+            scenes = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
             # If JSON parsing fails, try to extract JSON from the response
             json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
             if json_match:
-                scenes = json.loads(json_match.group())
+                scenes = orjson.loads(json_match.group())
             else:
                 # Fallback: create a simple scene structure
                 scenes = [{
@@ -120,6 +169,6 @@ class SceneGenerator:
     def save_scenes(self, scenes: List[Dict], output_dir: str = OUTPUT_DIR):
         ensure_output_dir(output_dir)
         path = os.path.join(output_dir, SCENES_FILE)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(scenes, f, indent=2)
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(scenes, option=orjson.OPT_INDENT_2))
         print(f"Saved {len(scenes)} scenes to {path}")